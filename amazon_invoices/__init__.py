@@ -0,0 +1,27 @@
+import importlib
+
+# Library code behind the Streamlit app and the command line.
+# Names are resolved on first use, so "import amazon_invoices" stays cheap and nothing
+# pulls in Selenium until a browser login is actually needed (Streamlit never).
+_EXPORTS = {
+    'extract_amazon_cookies': 'amazon_invoices.auth',
+    'create_session_with_cookies': 'amazon_invoices.auth',
+    'session_is_valid': 'amazon_invoices.auth',
+    'verify_amazon_login': 'amazon_invoices.auth',
+    'iter_orders': 'amazon_invoices.orders',
+    'fetch_amazon_orders': 'amazon_invoices.orders',
+    'download_invoices': 'amazon_invoices.pipeline',
+    'BrowserPool': 'amazon_invoices.browser',
+    'InvoiceManifest': 'amazon_invoices.manifest',
+    'Checkpoint': 'amazon_invoices.checkpoint',
+    'BlobStore': 'amazon_invoices.blobstore',
+    'DownloadJob': 'amazon_invoices.jobs',
+    'start_job': 'amazon_invoices.jobs',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
@@ -0,0 +1,263 @@
+import os
+from amazon_invoices import cookie_cache
+from amazon_invoices.report import log_report
+from amazon_invoices.profiling import span
+from amazon_invoices.session import ThrottledSession, USER_AGENT
+from amazon_invoices.http_cache import ResponseCache
+from amazon_invoices.parsing import parse_html, find_account_name
+
+# Selenium is only imported once a browser login is actually needed, so cached-session
+# runs and plain imports of this module stay fast
+
+LOGIN_URL = "https://www.amazon.com/ap/signin?openid.pape.max_auth_age=0&openid.return_to=https%3A%2F%2Fwww.amazon.com%2F%3Fref_%3Dnav_signin&openid.identity=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0%2Fidentifier_select&openid.assoc_handle=usflex&openid.mode=checkid_setup&openid.claimed_id=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0%2Fidentifier_select&openid.ns=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0"
+
+# Locators for the 2FA form, in order of preference
+OTP_FIELD_SELECTORS = [
+    '#auth-mfa-otpcode', '#ap_verification_code', '#auth-mfa-code', '#cvf-input-code',
+    "input[name='otpCode'], input[name='code'], input[name='cvf_verification_code']",
+    "input[type='number'], input[type='tel']"
+]
+OTP_SUBMIT_SELECTORS = [
+    '#auth-verify-button', '#auth-signin-button', '#cvf-submit-otp-button',
+    "input[type='submit'], button[type='submit']"
+]
+OTP_SUBMIT_TEXTS = ['submit', 'verify', 'continue']
+
+# Runs in the browser: returns the first element matching the selectors (in order),
+# then the first button whose text contains one of the given words. One round trip
+# instead of a failed find_element call per locator.
+FIND_FIRST_ELEMENT_SCRIPT = """
+const [selectors, texts] = arguments;
+for (const selector of selectors) {
+    const element = document.querySelector(selector);
+    if (element) return element;
+}
+for (const text of texts) {
+    for (const button of document.querySelectorAll('button')) {
+        if (button.textContent.toLowerCase().includes(text)) return button;
+    }
+}
+return null;
+"""
+
+# Function to find the first of several locators with a single browser round trip
+def find_first_element(driver, selectors, texts=()):
+    return driver.execute_script(FIND_FIRST_ELEMENT_SCRIPT, selectors, list(texts))
+
+# Function to wait until a click has navigated away from the current page and the next one has loaded
+def wait_for_navigation(driver, clicked_element, timeout=10):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
+    try:
+        WebDriverWait(driver, timeout).until(EC.staleness_of(clicked_element))
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+    except TimeoutException:
+        # Some error messages are rendered in place without a navigation
+        pass
+
+# Function to extract cookies using Selenium
+# Returns (cookies_dict, message); the message is "2FA_REQUIRED" when Amazon asks for a
+# verification code and none was given.
+def extract_amazon_cookies(email, password, verification_code=None, cache_cookies=False, browser_pool=None,
+                           screenshot_dir=None, report=log_report):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from amazon_invoices.browser import start_browser
+    
+    report('info', "🚀 Launching browser to extract cookies..." if browser_pool is None else "🚀 Using a warm browser to extract cookies...")
+    
+    driver = None
+    login_span = span('login', pooled=browser_pool is not None).start()
+    try:
+        with span('login.browser'):
+            driver = browser_pool.acquire(timeout=60) if browser_pool is not None else start_browser()
+        
+        with span('login.sign_in'):
+            # Navigate to Amazon login
+            driver.get(LOGIN_URL)
+            
+            # Handle email
+            try:
+                email_field = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.ID, "ap_email"))
+                )
+                email_field.send_keys(email)
+                
+                continue_button = driver.find_element(By.ID, "continue")
+                continue_button.click()
+            except Exception as e:
+                report('error', f"Error entering email: {e}")
+                return None, f"Error entering email: {e}"
+            
+            # Handle password
+            try:
+                password_field = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.ID, "ap_password"))
+                )
+                password_field.send_keys(password)
+                
+                signin_button = driver.find_element(By.ID, "signInSubmit")
+                signin_button.click()
+            except Exception as e:
+                report('error', f"Error entering password: {e}")
+                return None, f"Error entering password: {e}"
+            
+            # Check if 2FA is needed once the next page has loaded
+            wait_for_navigation(driver, signin_button)
+        
+        page_source = driver.page_source.lower()
+        if verification_code and ('verification' in page_source or 'two-factor' in page_source or 'otp' in page_source):
+            otp_span = span('login.2fa').start()
+            try:
+                # Find verification code input field - try different possible IDs and types
+                try:
+                    verif_field = WebDriverWait(driver, 10).until(
+                        lambda d: find_first_element(d, OTP_FIELD_SELECTORS)
+                    )
+                except TimeoutException:
+                    return None, "2FA required but couldn't find verification code input field"
+                
+                # Enter verification code
+                verif_field.send_keys(verification_code)
+                
+                # Find submit button
+                submit_button = find_first_element(driver, OTP_SUBMIT_SELECTORS, OTP_SUBMIT_TEXTS)
+                
+                if not submit_button:
+                    return None, "2FA required but couldn't find submit button"
+                
+                # Click submit and wait for the verification to go through
+                submit_button.click()
+                wait_for_navigation(driver, submit_button)
+            
+            except Exception as e:
+                report('error', f"Error handling 2FA: {e}")
+                return None, f"Error handling 2FA: {e}"
+            finally:
+                otp_span.finish()
+        
+        elif not verification_code and ('verification' in page_source or 'two-factor' in page_source or 'otp' in page_source):
+            # Need 2FA but no code provided
+            return None, "2FA_REQUIRED"
+        
+        # Check if login was successful
+        current_url = driver.current_url
+        
+        if "signin" in current_url or "ap/signin" in current_url:
+            # Still on login page, authentication failed
+            return None, "Login failed. Check your credentials."
+        
+        with span('login.cookies'):
+            # Extract cookies
+            cookies = driver.get_cookies()
+            
+            # Convert to format usable by requests
+            cookies_dict = {cookie['name']: cookie['value'] for cookie in cookies}
+            
+            # Remember the session so the next run can skip the browser entirely
+            if cache_cookies:
+                cookie_cache.save_cookies(email, password, cookies)
+        
+        # Save screenshot for debugging
+        if screenshot_dir:
+            driver.save_screenshot(os.path.join(screenshot_dir, "amazon_logged_in.png"))
+        
+        return cookies_dict, "Cookies extracted successfully"
+    
+    except Exception as e:
+        report('error', f"Error extracting cookies: {e}")
+        return None, f"Error extracting cookies: {e}"
+    
+    finally:
+        # Pooled browsers are wiped and kept warm; one-off browsers are shut down
+        if driver is not None:
+            if browser_pool is not None:
+                browser_pool.release(driver)
+            else:
+                driver.quit()
+        login_span.finish()
+
+# Function to create a session with the provided cookies.
+# cache_scope names the account the cookies belong to, so its cached pages are kept apart
+# from other accounts' in a shared cache_dir.
+def create_session_with_cookies(cookies_dict, max_per_host=None, max_workers=1, requests_per_second=None, cache_dir=None,
+                                cache_scope=None):
+    # One pooled connection per download worker, plus one for the thread paging through the order history
+    session = ThrottledSession(
+        max_per_host=max_per_host,
+        pool_size=max(max_workers, max_per_host or 0) + 1,
+        requests_per_second=requests_per_second,
+        cache=ResponseCache(cache_dir, scope=cache_scope) if cache_dir else None
+    )
+    
+    # Update headers to mimic a browser
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1'
+    })
+    
+    # Set cookies
+    for name, value in cookies_dict.items():
+        session.cookies.set(name, value, domain='.amazon.com')
+    
+    return session
+
+# Function to cheaply check that a session is still signed in, without downloading the page body
+def session_is_valid(session, probe_url):
+    try:
+        with span('session_check') as check_span:
+            response = session.get(probe_url, allow_redirects=False, stream=True)
+            check_span.set(status=response.status_code)
+            response.close()
+    except Exception:
+        return False
+    
+    if response.is_redirect:
+        return 'signin' not in response.headers.get('Location', '')
+    
+    return response.status_code == 200
+
+# Function to verify login status. The page is always requested from Amazon, never the cache.
+# With prime=True the response is handed on to the session's next GET of test_url; only pass
+# it when the crawl's first request will be for that same page.
+# Any requests.Session works; caching and priming only apply to a ThrottledSession.
+def verify_amazon_login(session, test_url, prime=False):
+    throttled = isinstance(session, ThrottledSession)
+    try:
+        with span('verify') as verify_span:
+            response = session.get(test_url, cache=False) if throttled else session.get(test_url)
+            verify_span.record_response(response)
+        
+        # Check if redirected to sign-in page
+        if 'signin' in response.url or 'ap/signin' in response.url:
+            return False, "Not logged in. Amazon is requesting authentication."
+        
+        with span('verify.parse'):
+            # Check for indicators of being logged in
+            root = parse_html(response.content)
+            
+            # Look for account/profile elements that indicate logged-in state
+            username = find_account_name(root)
+        page_text = response.text.lower()
+        
+        if username is not None and ('account' in page_text or 'hello' in page_text):
+            # The crawler's first request is for this same page; let it reuse the download
+            if prime and throttled:
+                session.prime(test_url, response)
+            
+            return True, f"Successfully authenticated as {username}!"
+        
+        return False, "Login verification failed. Cookies may be expired."
+    
+    except Exception as e:
+        return False, f"Error verifying login: {e}"
+
@@ -0,0 +1,206 @@
+import io
+import os
+import gzip
+import json
+import uuid
+import hashlib
+import zipfile
+import datetime
+import threading
+from amazon_invoices.files import write_chunks, write_bytes
+
+# zstd compresses HTML better and faster than gzip, but is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOBS_DIRNAME = ".blobs"
+INDEX_FILENAME = "index.jsonl"
+
+# File name suffix of a blob for each way it can be stored
+ENCODING_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+READ_CHUNK_SIZE = 64 * 1024
+
+def default_encoding():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+def _compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+# Content-addressed document store for a download folder.
+# Each distinct document is kept once, under its SHA-256, so split shipments and re-runs
+# that produce the same invoice share one blob. HTML is compressed; PDFs, which already
+# are, are stored as they are. An append-only index maps (order ID, file name) to the blob,
+# along with the order date so a date range can be exported later.
+class BlobStore:
+    def __init__(self, download_dir, encoding=None):
+        self.directory = os.path.join(download_dir, BLOBS_DIRNAME)
+        self.index_path = os.path.join(self.directory, INDEX_FILENAME)
+        self.encoding = encoding or default_encoding()
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._needs_newline = False
+        self._load()
+    
+    # A truncated last line (from a crash mid-write) is skipped, as in the download manifest
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._needs_newline = not line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and entry.get('order_id') and entry.get('sha256'):
+                    self._entries[(entry['order_id'], entry['name'])] = entry
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def blob_path(self, sha256, encoding=None):
+        return os.path.join(self.directory, sha256[:2], sha256 + ENCODING_SUFFIXES[encoding])
+    
+    # Function to find how a blob is stored: its encoding (None for as-is), or False if it isn't
+    def find(self, sha256):
+        for encoding in ENCODING_SUFFIXES:
+            if os.path.isfile(self.blob_path(sha256, encoding)):
+                return encoding
+        return False
+    
+    def has(self, sha256):
+        return self.find(sha256) is not False
+    
+    # Function to store a document given as chunks of bytes, without holding it in memory.
+    # Returns its index entry.
+    def put_stream(self, order_id, name, chunks, order_date=None):
+        os.makedirs(self.directory, exist_ok=True)
+        incoming = os.path.join(self.directory, f".incoming-{uuid.uuid4().hex}")
+        size, sha256 = write_chunks(incoming, chunks)
+        
+        encoding = self.find(sha256)
+        if encoding is False:
+            encoding = None
+            os.makedirs(os.path.dirname(self.blob_path(sha256)), exist_ok=True)
+            os.replace(incoming, self.blob_path(sha256))
+        else:
+            os.remove(incoming)
+        return self._record(order_id, name, sha256, size, encoding, order_date)
+    
+    # Function to store a document held in memory, compressed when compress is set
+    def put_bytes(self, order_id, name, data, compress=False, order_date=None):
+        sha256 = hashlib.sha256(data).hexdigest()
+        
+        encoding = self.find(sha256)
+        if encoding is False:
+            encoding = self.encoding if compress else None
+            os.makedirs(os.path.dirname(self.blob_path(sha256)), exist_ok=True)
+            write_bytes(self.blob_path(sha256, encoding), _compress(data, encoding) if encoding else data)
+        return self._record(order_id, name, sha256, len(data), encoding, order_date)
+    
+    def _record(self, order_id, name, sha256, size, encoding, order_date):
+        entry = {
+            'order_id': order_id,
+            'name': name,
+            'sha256': sha256,
+            'size': size,
+            'encoding': encoding,
+            'order_date': order_date.isoformat() if order_date else None,
+            'stored_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        }
+        line = json.dumps(entry) + '\n'
+        
+        with self._lock:
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                if self._needs_newline:
+                    f.write('\n')
+                    self._needs_newline = False
+                f.write(line)
+            self._entries[(order_id, name)] = entry
+        
+        return entry
+    
+    # Function to open a stored document for reading, decompressed
+    def open(self, entry):
+        encoding = self.find(entry['sha256'])
+        if encoding is False:
+            raise FileNotFoundError(f"Blob {entry['sha256']} of {entry['name']} is missing")
+        
+        f = open(self.blob_path(entry['sha256'], encoding), 'rb')
+        if encoding == 'gzip':
+            return gzip.GzipFile(fileobj=f, mode='rb')
+        if encoding == 'zstd':
+            if zstandard is None:
+                f.close()
+                raise RuntimeError(f"{entry['name']} is stored with zstd; install zstandard to read it")
+            return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+        return f
+    
+    # Function to list the stored documents, optionally only of orders placed between two
+    # dates (documents without an order date are left out of a date range)
+    def entries(self, since=None, until=None):
+        with self._lock:
+            entries = list(self._entries.values())
+        if since is not None or until is not None:
+            entries = [entry for entry in entries if entry['order_date'] and
+                       (since is None or entry['order_date'] >= since.isoformat()) and
+                       (until is None or entry['order_date'] <= until.isoformat())]
+        return sorted(entries, key=lambda entry: (entry['order_date'] or '', entry['name']))
+    
+    # Function to write a ZIP of the given documents to a writable file, which needn't be
+    # seekable (a socket or stdout will do)
+    def write_zip(self, entries, fileobj):
+        for chunk in self.iter_zip(entries):
+            fileobj.write(chunk)
+    
+    # Generator over the bytes of a ZIP of the given documents. Blobs are read and compressed
+    # a chunk at a time, so memory use doesn't grow with the size or number of documents.
+    def iter_zip(self, entries):
+        buffer = _ChunkBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for entry in entries:
+                info = zipfile.ZipInfo(entry['name'], date_time=_zip_time(entry))
+                info.compress_type = zipfile.ZIP_STORED if entry['name'].endswith('.pdf') else zipfile.ZIP_DEFLATED
+                with self.open(entry) as source, archive.open(info, 'w') as target:
+                    for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        yield from buffer.drain()
+        yield from buffer.drain()
+
+def _zip_time(entry):
+    stamp = entry.get('order_date') or entry['stored_at'][:10]
+    return tuple(int(part) for part in stamp.split('-')) + (0, 0, 0)
+
+# Write-only, non-seekable sink that hands written bytes back out in chunks
+class _ChunkBuffer(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self._position
+    
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+# Function to tell whether a download folder holds a blob, without loading its index
+def blob_exists(download_dir, sha256):
+    directory = os.path.join(download_dir, BLOBS_DIRNAME, sha256[:2])
+    return any(os.path.isfile(os.path.join(directory, sha256 + suffix)) for suffix in ENCODING_SUFFIXES.values())
@@ -0,0 +1,128 @@
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from amazon_invoices.session import USER_AGENT
+
+# Function to build the headless Chrome options used for every browser we start
+def chrome_options():
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--window-size=1920x1080")
+    options.add_argument(f"--user-agent={USER_AGENT}")
+    
+    # Try to avoid detection
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    
+    return options
+
+# Function to start a single headless Chrome
+def start_browser(options_factory=chrome_options):
+    return webdriver.Chrome(service=Service(), options=options_factory())
+
+# A fixed-size pool of pre-started headless Chrome instances.
+# Browsers are launched in the background as soon as the pool is created, handed out
+# with browser(), and wiped (cookies, current page) before the next caller gets them.
+class BrowserPool:
+    def __init__(self, size=1, options_factory=chrome_options, prewarm=True):
+        self.size = max(1, size)
+        self.options_factory = options_factory
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._closed = False
+        
+        if prewarm:
+            for _ in range(self.size):
+                self._reserve_slot()
+                threading.Thread(target=self._warm_up, daemon=True).start()
+        
+        atexit.register(self.close)
+    
+    def _reserve_slot(self):
+        with self._lock:
+            if self._closed or self._started >= self.size:
+                return False
+            self._started += 1
+            return True
+    
+    def _release_slot(self):
+        with self._lock:
+            self._started -= 1
+    
+    def _warm_up(self):
+        try:
+            driver = start_browser(self.options_factory)
+        except Exception:
+            # Leave the slot free; acquire() will start the browser itself and surface the error
+            self._release_slot()
+            return
+        
+        if self._closed:
+            driver.quit()
+        else:
+            self._idle.put(driver)
+    
+    def acquire(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        # No warm browser yet: start one if the pool still has room, otherwise wait for a release
+        if self._reserve_slot():
+            try:
+                return start_browser(self.options_factory)
+            except Exception:
+                self._release_slot()
+                raise
+        
+        return self._idle.get(timeout=timeout)
+    
+    def release(self, driver):
+        if self._closed:
+            self._discard(driver)
+            return
+        
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except Exception:
+            # The browser is unusable; replace it in the background
+            self._discard(driver)
+            if self._reserve_slot():
+                threading.Thread(target=self._warm_up, daemon=True).start()
+            return
+        
+        self._idle.put(driver)
+    
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self._release_slot()
+    
+    @contextmanager
+    def browser(self, timeout=None):
+        driver = self.acquire(timeout=timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+    
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
@@ -0,0 +1,159 @@
+import os
+import glob
+import json
+import time
+import uuid
+import datetime
+import threading
+from amazon_invoices.files import write_bytes
+
+JOBS_DIRNAME = ".jobs"
+
+# Seconds between checkpoint writes while a crawl is running; it is always written at the end
+CHECKPOINT_INTERVAL = 2.0
+
+# Values stored as ISO dates, in the options and in the order records waiting for a retry
+DATE_KEYS = ('since', 'until', 'order_date')
+
+# On-disk progress of one download job: the options it was started with, the cursor of the
+# first order in the history it hasn't finished yet, and orders that failed and are tried
+# again when the job resumes. Written atomically, so a crash leaves the previous checkpoint.
+# Orders between the cursor and where the crawl really stopped are re-checked on resume;
+# the download manifest makes that cheap for everything already saved.
+# Once a job is done with nothing left to retry, its checkpoint is deleted, so a download
+# folder only keeps the ones that can still be resumed.
+class Checkpoint:
+    def __init__(self, path, download_dir, options=None, email=None):
+        self.path = path
+        self.job_id = os.path.splitext(os.path.basename(path))[0]
+        self.download_dir = download_dir
+        self.options = options or {}
+        self.email = email
+        self.status = 'new'
+        self.message = None
+        self.cursor = None
+        self.retries = []
+        self.created_at = time.time()
+        self.updated_at = None
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+    
+    # Function to start a checkpoint for a new job in a download folder
+    @classmethod
+    def create(cls, download_dir, options=None, email=None):
+        job_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        checkpoint = cls(os.path.join(download_dir, JOBS_DIRNAME, job_id + ".json"), download_dir, options, email)
+        checkpoint.save()
+        return checkpoint
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f, object_hook=_decode_dates)
+        checkpoint = cls(path, state['download_dir'], state.get('options'), state.get('email'))
+        checkpoint.status = state.get('status', 'new')
+        checkpoint.message = state.get('message')
+        checkpoint.cursor = state.get('cursor')
+        checkpoint.retries = state.get('retries', [])
+        checkpoint.created_at = state.get('created_at', checkpoint.created_at)
+        checkpoint.updated_at = state.get('updated_at')
+        return checkpoint
+    
+    @property
+    def finished(self):
+        return self.status == 'done'
+    
+    # A job can be resumed unless it is done and no order is waiting for a retry
+    @property
+    def resumable(self):
+        return not self.finished or bool(self.retries)
+    
+    # Function to move the cursor on; written out at most once per CHECKPOINT_INTERVAL
+    def advance(self, cursor):
+        with self._lock:
+            self.cursor = cursor
+        if time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL:
+            self.save()
+    
+    def add_retry(self, record):
+        with self._lock:
+            self.retries.append(record)
+    
+    # Function to hand out the orders waiting for a retry; ones that fail again are re-added
+    def take_retries(self):
+        with self._lock:
+            retries, self.retries = self.retries, []
+        return retries
+    
+    def set_status(self, status, message=None):
+        self.status = status
+        self.message = message
+        if self.resumable:
+            self.save()
+        else:
+            self.discard()
+    
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+    
+    def save(self):
+        with self._lock:
+            self.updated_at = time.time()
+            state = {
+                'job_id': self.job_id,
+                'download_dir': self.download_dir,
+                'email': self.email,
+                'options': self.options,
+                'status': self.status,
+                'message': self.message,
+                'cursor': self.cursor,
+                'retries': self.retries,
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+            }
+            data = json.dumps(state, default=_encode_date, indent=1).encode('utf-8')
+            self._saved_at = time.monotonic()
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_bytes(self.path, data)
+
+# Function to name how a job's download_invoices run ended: 'done', 'stopped' (it can be
+# resumed), 'needs_2fa' or 'failed'
+def outcome_status(success, message, stopped=False):
+    if message == "2FA_REQUIRED":
+        return 'needs_2fa'
+    if not success:
+        return 'failed'
+    return 'stopped' if stopped else 'done'
+
+def _encode_date(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} can't be saved in a checkpoint")
+
+def _decode_dates(state):
+    for key in DATE_KEYS:
+        if isinstance(state.get(key), str):
+            try:
+                state[key] = datetime.date.fromisoformat(state[key])
+            except ValueError:
+                pass
+    return state
+
+# Function to list the resumable jobs checkpointed in a download folder, newest first.
+# Unreadable ones are skipped; finished ones left by older versions are deleted.
+def list_checkpoints(download_dir):
+    checkpoints = []
+    for path in glob.glob(os.path.join(download_dir, JOBS_DIRNAME, "*.json")):
+        try:
+            checkpoint = Checkpoint.load(path)
+        except (OSError, ValueError, KeyError):
+            continue
+        if checkpoint.resumable:
+            checkpoints.append(checkpoint)
+        else:
+            checkpoint.discard()
+    return sorted(checkpoints, key=lambda checkpoint: checkpoint.created_at, reverse=True)
@@ -0,0 +1,288 @@
+import os
+import re
+import csv
+import sys
+import json
+import getpass
+import logging
+import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from amazon_invoices import profiling
+from amazon_invoices.report import log_report
+from amazon_invoices.checkpoint import Checkpoint, JOBS_DIRNAME, outcome_status
+from amazon_invoices.orders import date_range_error
+from amazon_invoices.pipeline import download_invoices, DEFAULT_ORDERS_URL, DEFAULT_DOWNLOAD_DIR
+
+# Command-line entry point: "python -m amazon_invoices download" for one account,
+# "python -m amazon_invoices batch accounts.json" for many, each in its own process.
+
+def _add_download_options(parser):
+    parser.add_argument("--orders-url", default=DEFAULT_ORDERS_URL, help="Amazon order history URL")
+    parser.add_argument("--time-filter", help="Amazon time period filter, e.g. last30, months-3, year-2023")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="only orders placed on or after this date; paging stops once older orders appear")
+    parser.add_argument("--until", type=datetime.date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="only orders placed on or before this date")
+    parser.add_argument("--max-orders", type=int, help="stop after this many orders (default: all)")
+    parser.add_argument("--workers", type=int, default=4, help="orders downloaded in parallel (default: 4)")
+    parser.add_argument("--max-per-host", type=int, default=4, help="simultaneous connections per host (default: 4)")
+    parser.add_argument("--rps", type=float, default=5.0, help="max requests per second, 0 for unlimited (default: 5)")
+    parser.add_argument("--no-session-cache", action="store_true", help="don't reuse or save the signed-in session")
+    parser.add_argument("--no-http-cache", action="store_true", help="don't cache order pages on disk")
+    parser.add_argument("--redownload", action="store_true", help="download invoices that are already in the manifest")
+    parser.add_argument("--stop-at-synced", action="store_true", help="stop at the first already-downloaded order")
+    parser.add_argument("--no-render-pdfs", action="store_true", help="save HTML summaries instead of rendering PDFs")
+    parser.add_argument("--render-workers", type=int, help="headless Chrome instances used for PDF rendering")
+    parser.add_argument("--no-order-data", action="store_true", help="don't record order dates, items and totals for reports")
+    parser.add_argument("--storage", choices=("files", "blobs"), default="files",
+                        help="save loose files, or deduplicated and compressed in the folder's document store (default: files)")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="take fewer orders at once while resident memory is above MB")
+    parser.add_argument("--trace-memory", type=int, metavar="N",
+                        help="report where memory grew every N orders (slows the crawl down)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="record per-stage timings to FILE: Prometheus text for .prom/.txt, JSON lines otherwise")
+
+def _download_options(args):
+    return {
+        'orders_url': args.orders_url,
+        'time_filter': args.time_filter,
+        'since': args.since,
+        'until': args.until,
+        'max_orders': args.max_orders,
+        'max_workers': args.workers,
+        'max_per_host': args.max_per_host,
+        'requests_per_second': args.rps,
+        'remember_session': not args.no_session_cache,
+        'use_http_cache': not args.no_http_cache,
+        'skip_synced': not args.redownload,
+        'stop_at_synced': args.stop_at_synced and not args.redownload,
+        'render_pdfs': not args.no_render_pdfs,
+        'render_workers': args.render_workers,
+        'extract_data': not args.no_order_data,
+        'storage': args.storage,
+        'memory_budget_mb': args.memory_budget,
+        'trace_memory_every': args.trace_memory,
+    }
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="amazon_invoices", description="Download Amazon invoices without the web UI.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show per-order progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    download = commands.add_parser("download", help="download invoices for one account")
+    download.add_argument("--email", required=True)
+    download.add_argument("--password-env", default="AMAZON_PASSWORD",
+                          help="environment variable holding the password; prompts if it is unset")
+    download.add_argument("--otp", help="two-factor verification code")
+    download.add_argument("--download-dir", default=DEFAULT_DOWNLOAD_DIR)
+    download.add_argument("--resume", metavar="JOB_ID",
+                          help="continue a stopped or failed download from its checkpoint, with its original options")
+    _add_download_options(download)
+    
+    batch = commands.add_parser("batch", help="download invoices for every account in a JSON file, in parallel processes")
+    batch.add_argument("accounts_file", help='JSON list of {"email", "password" or "password_env", optional "download_dir", ...}')
+    batch.add_argument("--processes", type=int, help="accounts processed at once (default: up to 4)")
+    batch.add_argument("--download-dir", default=DEFAULT_DOWNLOAD_DIR,
+                       help="parent directory; each account gets a subdirectory unless it sets download_dir")
+    _add_download_options(batch)
+    
+    report = commands.add_parser("report", help="summarise spending from the order data of earlier downloads")
+    report.add_argument("--download-dir", default=DEFAULT_DOWNLOAD_DIR)
+    report.add_argument("--by", choices=("month", "category", "tax-year"), default="month")
+    report.add_argument("--tax-year-start", type=int, default=1, choices=range(1, 13), metavar="MONTH",
+                        help="first month of the tax year, e.g. 4 for April (default: 1)")
+    report.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    
+    export = commands.add_parser("export", help="write a ZIP of the documents in a download folder's document store")
+    export.add_argument("--download-dir", default=DEFAULT_DOWNLOAD_DIR)
+    export.add_argument("--since", type=datetime.date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="only documents of orders placed on or after this date")
+    export.add_argument("--until", type=datetime.date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="only documents of orders placed on or before this date")
+    export.add_argument("-o", "--output", required=True, help="ZIP file to write, or - for standard output")
+    
+    return parser
+
+def _account_dirname(email):
+    return re.sub(r'[^A-Za-z0-9@._-]+', '_', email)
+
+# In batch mode every account process writes its own profile next to the requested one
+def _account_profile_path(profile_path, email):
+    stem, ext = os.path.splitext(profile_path)
+    return f"{stem}.{_account_dirname(email)}{ext}"
+
+# Runs in a worker process: one account, with its own browser and HTTP session
+def _run_account(account, options, verbose, profile_path=None):
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    email = account['email']
+    recorder = profiling.enable() if profile_path else None
+    
+    def report(level, message):
+        log_report(level, f"[{email}] {message}")
+    
+    password = account.get('password') or os.environ.get(account.get('password_env', ''), '')
+    if not password:
+        return email, False, "No password given (set 'password' or 'password_env')"
+    
+    # Per-account settings override the command-line defaults
+    account_options = dict(options)
+    account_options.update({key: value for key, value in account.items() if key in options or key == 'download_dir'})
+    
+    try:
+        # Dates in the accounts file are ISO strings
+        for key in ('since', 'until'):
+            if isinstance(account_options.get(key), str):
+                account_options[key] = datetime.date.fromisoformat(account_options[key])
+        
+        success, message = download_invoices(
+            email, password,
+            verification_code=account.get('otp'),
+            report=report,
+            **account_options
+        )
+    except Exception as e:
+        success, message = False, f"Unexpected error: {e}"
+    
+    if recorder is not None:
+        recorder.write(profile_path)
+    
+    if message == "2FA_REQUIRED":
+        message = "Amazon requires a verification code; run this account with 'download --otp'"
+    return email, success, message
+
+def run_batch(accounts, options, processes=None, verbose=False, parent_dir=DEFAULT_DOWNLOAD_DIR, profile_path=None):
+    for account in accounts:
+        account.setdefault('download_dir', os.path.join(parent_dir, _account_dirname(account['email'])))
+    
+    # Spawned rather than forked workers, so no process inherits another's threads or browser
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with ProcessPoolExecutor(max_workers=processes or min(4, len(accounts)), mp_context=context) as executor:
+        futures = [
+            executor.submit(_run_account, account, options, verbose,
+                            _account_profile_path(profile_path, account['email']) if profile_path else None)
+            for account in accounts
+        ]
+        for future in as_completed(futures):
+            email, success, message = future.result()
+            print(f"{'OK ' if success else 'ERR'} {email}: {message}", flush=True)
+            results.append((email, success, message))
+    return results
+
+def print_spend_report(args):
+    from amazon_invoices import dataset
+    
+    if not dataset.is_available():
+        print("Spend reports need pyarrow (pip install pyarrow).")
+        return 1
+    
+    table = dataset.load_dataset(args.download_dir)
+    if table is None or table.num_rows == 0:
+        print(f"No order data in {args.download_dir} yet; download some invoices first.")
+        return 1
+    
+    if args.by == "tax-year":
+        rows = dataset.spend_by_tax_year(table, start_month=args.tax_year_start).to_pylist()
+    else:
+        rows = dataset.REPORTS[args.by](table).to_pylist()
+    
+    if args.format == "json":
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    elif args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        columns = list(rows[0]) if rows else []
+        widths = {column: max(len(column), *(len(f"{row[column]}") for row in rows)) for column in columns}
+        print("  ".join(column.rjust(widths[column]) for column in columns))
+        for row in rows:
+            print("  ".join(f"{row[column]}".rjust(widths[column]) for column in columns))
+    return 0
+
+def export_documents(args):
+    from amazon_invoices.blobstore import BlobStore
+    
+    store = BlobStore(args.download_dir)
+    entries = store.entries(since=args.since, until=args.until)
+    if not entries:
+        print(f"No stored documents in {args.download_dir} for that range; download with --storage blobs first.", file=sys.stderr)
+        return 1
+    
+    if args.output == "-":
+        store.write_zip(entries, sys.stdout.buffer)
+    else:
+        with open(args.output, 'wb') as f:
+            store.write_zip(entries, f)
+        print(f"Wrote {len(entries)} documents to {args.output}", file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    # A range no order can be in would only be found out after signing in
+    if getattr(args, 'since', None) is not None:
+        error = date_range_error(args.since, args.until)
+        if error is not None:
+            parser.error(error)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    
+    if args.command == "report":
+        return print_spend_report(args)
+    if args.command == "export":
+        return export_documents(args)
+    
+    options = _download_options(args)
+    
+    if args.command == "download":
+        # Every download is checkpointed, so an interrupted one can be picked up with --resume
+        if args.resume:
+            try:
+                checkpoint = Checkpoint.load(os.path.join(args.download_dir, JOBS_DIRNAME, args.resume + ".json"))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Can't resume {args.resume}: {e}")
+                return 1
+            options = checkpoint.options
+        else:
+            checkpoint = Checkpoint.create(args.download_dir, options, args.email)
+        
+        password = os.environ.get(args.password_env) or getpass.getpass("Amazon password: ")
+        recorder = profiling.enable() if args.profile else None
+        checkpoint.set_status('running')
+        try:
+            success, message = download_invoices(
+                args.email, password,
+                download_dir=args.download_dir,
+                verification_code=args.otp,
+                checkpoint=checkpoint,
+                **options
+            )
+        except KeyboardInterrupt:
+            success, message = False, "Interrupted"
+        finally:
+            if recorder is not None:
+                profiling.disable()
+                recorder.write(args.profile)
+        
+        checkpoint.set_status(outcome_status(success, message), message)
+        if message == "2FA_REQUIRED":
+            message = f"Amazon requires a verification code; run again with --resume {checkpoint.job_id} --otp CODE"
+        elif not success:
+            message += f" (continue with --resume {checkpoint.job_id})"
+        print(message)
+        return 0 if success else 1
+    
+    with open(args.accounts_file, 'r', encoding='utf-8') as f:
+        accounts = json.load(f)
+    if not accounts:
+        print("No accounts to process.")
+        return 0
+    
+    results = run_batch(accounts, options, processes=args.processes, verbose=args.verbose,
+                        parent_dir=args.download_dir, profile_path=args.profile)
+    return 0 if all(success for _, success, _ in results) else 1
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import base64
+import hashlib
+
+# Encryption is optional: without the cryptography package the cache is simply disabled
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:
+    Fernet = None
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".amazon_invoices", "sessions")
+
+# Cached sessions are never trusted for longer than this, whatever the cookies claim
+MAX_SESSION_AGE = 12 * 60 * 60
+
+KDF_ITERATIONS = 390000
+
+def is_available():
+    return Fernet is not None
+
+# One cache file per account, named after a hash so the email isn't visible on disk
+def _cache_path(email, cache_dir=None):
+    account = hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:32]
+    return os.path.join(cache_dir or CACHE_DIR, f"{account}.json")
+
+# The key is derived from the account password, so the cache is useless without it
+def _fernet(password, salt):
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8'))))
+
+# Function to cache the cookies returned by Selenium's driver.get_cookies()
+def save_cookies(email, password, cookies, cache_dir=None):
+    if not is_available():
+        return False
+    
+    now = time.time()
+    expires_at = now + MAX_SESSION_AGE
+    
+    # Stop trusting the cache as soon as the first expiring cookie runs out
+    expiries = [cookie['expiry'] for cookie in cookies if cookie.get('expiry')]
+    if expiries:
+        expires_at = min(expires_at, min(expiries))
+    
+    payload = {
+        'cookies': {cookie['name']: cookie['value'] for cookie in cookies},
+        'saved_at': now,
+        'expires_at': expires_at,
+    }
+    
+    salt = os.urandom(16)
+    token = _fernet(password, salt).encrypt(json.dumps(payload).encode('utf-8'))
+    
+    path = _cache_path(email, cache_dir)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    
+    # Write to a private temp file and swap it in so a crash never leaves half a cache behind
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({
+            'salt': base64.b64encode(salt).decode('ascii'),
+            'expires_at': expires_at,
+            'token': token.decode('ascii'),
+        }, f)
+    os.replace(tmp_path, path)
+    
+    return True
+
+# Function to load cached cookies; returns None when missing, expired or unreadable
+def load_cookies(email, password, cache_dir=None):
+    if not is_available():
+        return None
+    
+    path = _cache_path(email, cache_dir)
+    try:
+        with open(path, 'r') as f:
+            stored = json.load(f)
+        
+        # The plaintext expiry lets stale entries be dropped without paying for the key derivation
+        if stored['expires_at'] <= time.time():
+            clear_cookies(email, cache_dir)
+            return None
+        
+        salt = base64.b64decode(stored['salt'])
+        payload = json.loads(_fernet(password, salt).decrypt(stored['token'].encode('ascii')))
+    except (OSError, ValueError, KeyError, InvalidToken):
+        return None
+    
+    if payload['expires_at'] <= time.time():
+        clear_cookies(email, cache_dir)
+        return None
+    
+    return payload['cookies']
+
+def clear_cookies(email, cache_dir=None):
+    try:
+        os.remove(_cache_path(email, cache_dir))
+    except OSError:
+        pass
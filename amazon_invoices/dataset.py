@@ -0,0 +1,223 @@
+import os
+import glob
+import time
+
+# The columnar store is optional: without pyarrow no order data is recorded
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DATASET_DIRNAME = "invoice_data"
+
+# Small part files are merged into one once there are more than this many
+COMPACT_AFTER_PARTS = 16
+
+# Keyword rules for the spend-by-category report, checked in order against each item title.
+# Amazon's invoices don't carry a product category, so it is derived at report time and
+# the rules can be changed without re-downloading anything.
+DEFAULT_CATEGORY_RULES = [
+    ('Books', r'\b(?:paperback|hardcover|kindle edition|book|novel|edition)\b'),
+    ('Electronics', r'\b(?:usb|charger|cable|hdmi|headphones?|earbuds|battery|batteries|ssd|monitor|keyboard|mouse|adapter|speaker)\b'),
+    ('Office', r'\b(?:printer|ink|toner|paper|pens?|notebook|stapler|envelopes?)\b'),
+    ('Grocery', r'\b(?:coffee|tea|snacks?|organic|chocolate|cereal|pasta|sauce)\b'),
+    ('Health & Personal Care', r'\b(?:vitamins?|supplements?|shampoo|toothpaste|soap|lotion|razor)\b'),
+    ('Home & Kitchen', r'\b(?:kitchen|cookware|pan|knife|towels?|bedding|sheets|pillow|vacuum|lamp|storage)\b'),
+    ('Clothing', r'\b(?:shirt|t-shirt|socks|jacket|shoes|dress|pants|jeans|hoodie)\b'),
+    ('Toys & Games', r'\b(?:toy|lego|puzzle|board game|game)\b'),
+]
+OTHER_CATEGORY = 'Other'
+
+def is_available():
+    return pa is not None
+
+def _schema():
+    item = pa.struct([('title', pa.string()), ('quantity', pa.int32()), ('price', pa.float64())])
+    return pa.schema([
+        ('order_id', pa.string()),
+        ('order_date', pa.date32()),
+        ('items', pa.list_(item)),
+        ('item_count', pa.int32()),
+        ('subtotal', pa.float64()),
+        ('shipping', pa.float64()),
+        ('tax', pa.float64()),
+        ('total', pa.float64()),
+        ('currency', pa.string()),
+        ('payment_method', pa.string()),
+        ('source', pa.string()),
+        ('fetched_at', pa.timestamp('us', tz='UTC')),
+    ])
+
+# Append-only Parquet dataset of per-order records, one directory per download folder.
+# Each run adds one part file; an order fetched more than once keeps its latest record.
+# Parts are merged once they pile up, so reading the dataset stays a handful of file opens.
+class InvoiceDataset:
+    def __init__(self, directory):
+        self.directory = directory
+        self._pending = []
+    
+    def add(self, record):
+        self._pending.append(record)
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.directory, "part-*.parquet")))
+    
+    # Function to write the records added so far as a new part file
+    def flush(self):
+        if not self._pending:
+            return None
+        
+        os.makedirs(self.directory, exist_ok=True)
+        table = pa.Table.from_pylist(self._pending, schema=_schema())
+        path = os.path.join(self.directory, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{time.monotonic_ns()}.parquet")
+        _write_table(table, path)
+        self._pending = []
+        
+        if len(self._parts()) > COMPACT_AFTER_PARTS:
+            self.compact()
+        return path
+    
+    # Function to read every record, keeping only the latest one per order
+    def load(self):
+        parts = self._parts()
+        if not parts:
+            return _schema().empty_table()
+        if len(parts) == 1:
+            # A single part is either one run's records or an already deduplicated compaction
+            return pq.read_table(parts[0], schema=_schema())
+        return latest_per_order(pa.concat_tables([pq.read_table(part, schema=_schema()) for part in parts]))
+    
+    # Function to merge every part into one deduplicated file
+    def compact(self):
+        parts = self._parts()
+        if len(parts) < 2:
+            return
+        table = self.load()
+        path = os.path.join(self.directory, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-compact.parquet")
+        _write_table(table, path)
+        for part in parts:
+            if part != path:
+                os.remove(part)
+
+# Written to a temporary name first, so readers never see half a part file
+def _write_table(table, path):
+    tmp_path = path + ".part"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+# Function to drop all but the most recently fetched record of each order
+def latest_per_order(table):
+    if table.num_rows == 0:
+        return table
+    table = table.take(pc.sort_indices(table, [('order_id', 'ascending'), ('fetched_at', 'descending')]))
+    order_ids = table.column('order_id').combine_chunks()
+    first = np.ones(table.num_rows, dtype=bool)
+    first[1:] = pc.not_equal(order_ids[1:], order_ids[:-1]).to_numpy(zero_copy_only=False)
+    return table.filter(pa.array(first))
+
+# The grouping keys below are computed as whole columns; nothing loops over orders in Python
+
+MONEY_COLUMNS = ('subtotal', 'shipping', 'tax', 'total', 'spend')
+
+def _rounded(table):
+    for position, name in enumerate(table.column_names):
+        if name in MONEY_COLUMNS:
+            table = table.set_column(position, name, pc.round(table.column(name), 2))
+    return table
+
+def _spend_columns(table):
+    return [
+        ('orders', pc.cast(pc.is_valid(table.column('order_id')), pa.int64())),
+        ('subtotal', pc.fill_null(table.column('subtotal'), 0.0)),
+        ('shipping', pc.fill_null(table.column('shipping'), 0.0)),
+        ('tax', pc.fill_null(table.column('tax'), 0.0)),
+        ('total', pc.fill_null(table.column('total'), 0.0)),
+    ]
+
+def _grouped_spend(key_name, keys, table):
+    columns = [(key_name, keys)] + _spend_columns(table)
+    grouped = pa.table(dict(columns)).filter(pc.is_valid(keys)).group_by(key_name).aggregate(
+        [(name, 'sum') for name, _ in columns[1:]]
+    )
+    grouped = grouped.rename_columns([name.removesuffix('_sum') for name in grouped.column_names])
+    return _rounded(grouped.select([name for name, _ in columns]).sort_by(key_name))
+
+# Function to total spend per calendar month ("2024-12")
+def spend_by_month(table):
+    dates = table.column('order_date')
+    
+    # Grouping on an integer yyyymm is far cheaper than formatting every date first
+    keys = pc.add(pc.multiply(pc.year(dates), 100), pc.month(dates))
+    grouped = _grouped_spend('month', keys, table)
+    labels = pa.array([f"{key // 100:04d}-{key % 100:02d}" for key in grouped.column('month').to_pylist()], pa.string())
+    return grouped.set_column(0, 'month', labels)
+
+# Function to total spend per tax year. With a start month other than January (e.g. 4 for
+# an April-March year) a tax year is named after the calendar year it starts in.
+def spend_by_tax_year(table, start_month=1):
+    dates = table.column('order_date')
+    years = pc.year(dates)
+    if start_month != 1:
+        years = pc.subtract(years, pc.cast(pc.less(pc.month(dates), start_month), pa.int64()))
+    return _grouped_spend('tax_year', years, table)
+
+# Function to total item spend per category.
+# Items without a price on the invoice (PDF summaries only list them on the order card)
+# split what is left of their order's subtotal, or total, once its priced items are taken
+# out, in proportion to their quantity.
+def spend_by_category(table, rules=DEFAULT_CATEGORY_RULES):
+    items = table.column('items').combine_chunks()
+    flat = pc.list_flatten(items)
+    if len(flat) == 0:
+        return pa.table({'category': pa.array([], pa.string()), 'items': pa.array([], pa.int64()),
+                         'spend': pa.array([], pa.float64())})
+    
+    parents = pc.list_parent_indices(items).to_numpy()
+    quantity = pc.fill_null(flat.field('quantity'), 1).to_numpy(zero_copy_only=False).astype(np.float64)
+    price = flat.field('price').to_numpy(zero_copy_only=False).astype(np.float64)
+    
+    unpriced = np.isnan(price)
+    priced_spend = np.where(unpriced, 0.0, price * quantity)
+    
+    order_amount = pc.coalesce(table.column('subtotal'), table.column('total')).to_numpy(zero_copy_only=False).astype(np.float64)
+    remainder = np.maximum(order_amount - np.bincount(parents, weights=priced_spend, minlength=table.num_rows), 0.0)
+    unpriced_quantity = np.bincount(parents, weights=np.where(unpriced, quantity, 0.0), minlength=table.num_rows)
+    share = remainder[parents] * quantity / np.where(unpriced_quantity[parents] > 0, unpriced_quantity[parents], 1)
+    spend = np.where(unpriced, share, priced_spend)
+    
+    # Each distinct title is matched against the rules once, however often it was bought.
+    # Rules are applied last to first so that the earliest matching rule wins.
+    names = [name for name, _ in rules] + [OTHER_CATEGORY]
+    distinct = pc.fill_null(flat.field('title'), '').dictionary_encode()
+    lowered = pc.utf8_lower(distinct.dictionary)
+    title_category = np.full(len(lowered), len(rules), dtype=np.int64)
+    for position in range(len(rules) - 1, -1, -1):
+        title_category[pc.match_substring_regex(lowered, rules[position][1]).to_numpy(zero_copy_only=False)] = position
+    category = title_category[distinct.indices.to_numpy(zero_copy_only=False)]
+    
+    present = np.bincount(category, minlength=len(names)) > 0
+    result = pa.table({
+        'category': pa.array(np.array(names, dtype=object)[present], pa.string()),
+        'items': pa.array(np.bincount(category, weights=quantity, minlength=len(names))[present].astype(np.int64)),
+        'spend': pa.array(np.bincount(category, weights=np.nan_to_num(spend), minlength=len(names))[present]),
+    })
+    return _rounded(result.sort_by([('spend', 'descending')]))
+
+REPORTS = {
+    'month': spend_by_month,
+    'category': spend_by_category,
+    'tax-year': spend_by_tax_year,
+}
+
+# Function to load a download folder's order data; None when there is none or pyarrow is missing
+def load_dataset(download_dir):
+    directory = os.path.join(download_dir, DATASET_DIRNAME)
+    if not is_available() or not os.path.isdir(directory):
+        return None
+    return InvoiceDataset(directory).load()
@@ -0,0 +1,56 @@
+import os
+import hashlib
+import tempfile
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Function to write chunks of bytes to a file atomically.
+# The data goes to a temporary file next to the target, which is fsynced and then
+# atomically renamed into place, so an interrupted write never leaves a truncated
+# file under the final name. Returns the byte size and SHA-256 of what was written.
+def write_chunks(filepath, chunks):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filepath) + '.', suffix='.part')
+    
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                if chunk:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    
+    _fsync_directory(directory)
+    return size, digest.hexdigest()
+
+# Function to stream a response body into a file without holding it in memory
+def stream_to_file(response, filepath, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    return write_chunks(filepath, response.iter_content(chunk_size=chunk_size))
+
+def write_bytes(filepath, data):
+    return write_chunks(filepath, [data])
+
+# Persist the rename itself; not every platform lets you open a directory
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,171 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from amazon_invoices.files import write_bytes
+
+CACHE_DIRNAME = ".http_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# How long each kind of page is served from the cache without asking Amazon again.
+# Checked in order; URLs that match none of them are never cached.
+DEFAULT_TTLS = [
+    ('order_details', re.compile(r'order-details'), 24 * 60 * 60),
+    ('invoice', re.compile(r'invoice|print-summary|summary/print'), 7 * 24 * 60 * 60),
+    ('orders', re.compile(r'order-history|your-orders/orders'), 5 * 60),
+]
+
+# Headers worth keeping with a cached body (the body itself is stored already decoded)
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Date')
+
+# Function to decide how long a URL may be served from the cache; None means don't cache it
+def ttl_for(url, ttls=DEFAULT_TTLS):
+    for _, pattern, ttl in ttls:
+        if pattern.search(url):
+            return ttl
+    return None
+
+# Size-bounded on-disk cache of GET responses.
+# Bodies live in one file each; an SQLite index keeps the URL, headers, validators,
+# expiry and last access time, and the least recently used entries are evicted once
+# the bodies exceed max_bytes.
+# Amazon serves different pages to different accounts at the same URL, so entries are keyed
+# by scope (the account's email) as well; sessions of two accounts sharing a directory never
+# see each other's pages.
+class ResponseCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, ttls=DEFAULT_TTLS, scope=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.scope = scope
+        self._lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                final_url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+    
+    def _key(self, url):
+        scoped = url if self.scope is None else f"{self.scope.lower()}\n{url}"
+        return hashlib.sha256(scoped.encode('utf-8')).hexdigest()
+    
+    def _body_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+    
+    # Function to look up a URL; returns (entry, body) or None. Stale entries are returned too,
+    # so the caller can revalidate them with their ETag/Last-Modified.
+    def get(self, url):
+        key = self._key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT final_url, status, headers, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            try:
+                with open(self._body_path(key), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                self._delete(key)
+                return None
+            
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        
+        final_url, status, headers, expires_at = row
+        entry = {
+            'url': final_url,
+            'status': status,
+            'headers': json.loads(headers),
+            'fresh': expires_at > time.time(),
+        }
+        return entry, body
+    
+    def put(self, url, response):
+        ttl = ttl_for(url, self.ttls)
+        if ttl is None:
+            return
+        
+        key = self._key(url)
+        body = response.content
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        os.makedirs(os.path.dirname(self._body_path(key)), exist_ok=True)
+        write_bytes(self._body_path(key), body)
+        
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, response.url, response.status_code, json.dumps(headers), len(body), now + ttl, now)
+            )
+            self._db.commit()
+            self._evict()
+    
+    # Function to mark a stale entry fresh again after the server answered 304 Not Modified
+    def refresh(self, url):
+        ttl = ttl_for(url, self.ttls)
+        if ttl is None:
+            return
+        
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET expires_at = ?, last_access = ? WHERE key = ?", (now + ttl, now, self._key(url))
+            )
+            self._db.commit()
+    
+    def _delete(self, key):
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._db.commit()
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+    
+    # Drop least recently used entries until the bodies fit in 90% of the budget
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        target = self.max_bytes * 0.9
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            self._delete(key)
+            total -= size
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Function to turn a cache entry back into a requests.Response
+def cached_response(entry, body, request=None):
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.reason = 'OK'
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.url = entry['url']
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.request = request
+    response._content = body
+    response._content_consumed = True
+    response.from_cache = True
+    return response
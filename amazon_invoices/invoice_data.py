@@ -0,0 +1,165 @@
+import re
+import datetime
+from dateutil import parser as date_parser
+from amazon_invoices.parsing import text_lines, find_item_titles
+
+# Extraction of typed order data (date, items, totals, payment method) from the pages the
+# crawler already downloads: the order card, the invoice page and, when Amazon serves one
+# as HTML, the printable summary. Everything works on the visible text, line by line,
+# so it doesn't depend on Amazon's CSS class names.
+
+CURRENCY_SYMBOLS = {
+    'CDN$': 'CAD', 'A$': 'AUD', 'R$': 'BRL', '$': 'USD', '£': 'GBP', '€': 'EUR', '₹': 'INR', '¥': 'JPY',
+}
+
+MONEY_RE = re.compile(
+    r'(?P<symbol>CDN\$|A\$|R\$|[$£€₹¥]|USD|CAD|GBP|EUR|INR|JPY)?\s?'
+    r'(?P<amount>-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{1,2})?)'
+)
+
+# Order-total labels as they appear on invoices and printable summaries; the first match wins
+TOTAL_LABELS = [
+    ('subtotal', re.compile(r'^(?:item\(s\) subtotal|items? subtotal|subtotal)\b', re.IGNORECASE)),
+    ('shipping', re.compile(r'^(?:shipping\s*(?:&|and)\s*handling|shipping|postage\s*(?:&|and)\s*packing|delivery)\b', re.IGNORECASE)),
+    ('tax', re.compile(r'^(?:estimated\s+)?(?:sales\s+)?tax(?:\s+to\s+be\s+collected)?\b|^(?:vat|gst)\b', re.IGNORECASE)),
+    ('total', re.compile(r'^(?:grand total|order total|total(?!\s+before))\b', re.IGNORECASE)),
+]
+PAYMENT_RE = re.compile(r'^payment method\b', re.IGNORECASE)
+ORDER_PLACED_RE = re.compile(r'^order placed\b', re.IGNORECASE)
+CARD_TOTAL_RE = re.compile(r'^total\b', re.IGNORECASE)
+ITEM_RE = re.compile(r'^(\d+)\s*of:\s*(.*)$', re.IGNORECASE)
+
+# Dates Amazon prints are always complete, so the default only guards against partial ones
+_DATE_DEFAULT = datetime.datetime(2000, 1, 1)
+
+# Function to turn "$1,234.56" into (1234.56, 'USD'); (None, None) if there is no amount
+def parse_money(text, require_symbol=False):
+    match = MONEY_RE.search(text or '')
+    if not match or require_symbol and match.group('symbol') is None:
+        return None, None
+    amount = float(match.group('amount').replace(',', ''))
+    symbol = match.group('symbol')
+    return amount, CURRENCY_SYMBOLS.get(symbol, symbol)
+
+# Function to parse an order date like "December 24, 2024" or "24 December 2024"
+def parse_order_date(text):
+    if not text:
+        return None
+    try:
+        return date_parser.parse(text, fuzzy=True, default=_DATE_DEFAULT).date()
+    except (ValueError, OverflowError):
+        return None
+
+# A label's value is either on the same line ("Grand Total: $28.13") or the next one
+def _value_after(lines, i, match):
+    rest = lines[i][match.end():].strip(' :\t')
+    if rest:
+        return rest
+    return lines[i + 1] if i + 1 < len(lines) else ''
+
+# Same for amounts; requiring a currency symbol keeps addresses and dates from passing as money
+def _money_after(lines, i, match):
+    amount, currency = parse_money(lines[i][match.end():], require_symbol=True)
+    if amount is None and i + 1 < len(lines):
+        amount, currency = parse_money(lines[i + 1], require_symbol=True)
+    return amount, currency
+
+def _is_price_line(line):
+    match = MONEY_RE.fullmatch(line.strip())
+    return match is not None and match.group('symbol') is not None
+
+def _items_from_lines(lines):
+    items = []
+    for i, line in enumerate(lines):
+        match = ITEM_RE.match(line)
+        if not match:
+            continue
+        title = match.group(2).strip() or (lines[i + 1] if i + 1 < len(lines) else '')
+        
+        # The price is the first bare amount below the title, before the next item starts
+        price = None
+        for following in lines[i + 1:i + 12]:
+            if ITEM_RE.match(following):
+                break
+            if _is_price_line(following):
+                price = parse_money(following)[0]
+                break
+        
+        items.append({'title': ' '.join(title.split()), 'quantity': int(match.group(1)), 'price': price})
+    return items
+
+# Function to fill whichever fields of a record are still empty from one page's text
+def _fill_from_lines(data, lines):
+    for i, line in enumerate(lines):
+        for field, label in TOTAL_LABELS:
+            if data[field] is not None:
+                continue
+            match = label.match(line)
+            if not match:
+                continue
+            amount, currency = _money_after(lines, i, match)
+            if amount is not None:
+                data[field] = amount
+                data['currency'] = data['currency'] or currency
+            break
+        
+        if data['payment_method'] is None:
+            match = PAYMENT_RE.match(line)
+            if match:
+                data['payment_method'] = ' '.join(_value_after(lines, i, match).split()) or None
+        
+        if data['order_date'] is None:
+            match = ORDER_PLACED_RE.match(line)
+            if match:
+                data['order_date'] = parse_order_date(_value_after(lines, i, match))
+    
+    if not data['items']:
+        data['items'] = _items_from_lines(lines)
+
+# Function to read what an order card itself shows: placed-on date, order total and product titles
+def extract_card_summary(card):
+    lines = text_lines(card)
+    summary = {'order_date': None, 'order_total': None, 'currency': None, 'item_titles': find_item_titles(card)}
+    
+    for i, line in enumerate(lines):
+        match = ORDER_PLACED_RE.match(line)
+        if match and summary['order_date'] is None:
+            summary['order_date'] = parse_order_date(_value_after(lines, i, match))
+            continue
+        
+        match = CARD_TOTAL_RE.match(line)
+        if match and summary['order_total'] is None:
+            summary['order_total'], summary['currency'] = _money_after(lines, i, match)
+    
+    return summary
+
+# Function to build an order's typed record.
+# pages are the visible text lines (text_lines(root)) of the pages fetched for the order, most
+# detailed first (printable summary, then invoice page); each field is taken from the first
+# page that has it, then from the order card in the record.
+def extract_invoice_record(record, pages=(), source=None):
+    data = {
+        'order_id': record['order_id'],
+        'order_date': None,
+        'items': [],
+        'subtotal': None,
+        'shipping': None,
+        'tax': None,
+        'total': None,
+        'currency': None,
+        'payment_method': None,
+        'source': source or ('invoice' if pages else 'order_card'),
+        'fetched_at': datetime.datetime.now(datetime.timezone.utc),
+    }
+    
+    for lines in pages:
+        _fill_from_lines(data, lines)
+    
+    data['order_date'] = data['order_date'] or record.get('order_date')
+    data['total'] = data['total'] if data['total'] is not None else record.get('order_total')
+    data['currency'] = data['currency'] or record.get('currency')
+    if not data['items']:
+        data['items'] = [{'title': title, 'quantity': 1, 'price': None} for title in record.get('item_titles', ())]
+    
+    data['item_count'] = sum(item['quantity'] for item in data['items'])
+    return data
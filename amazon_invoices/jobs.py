@@ -0,0 +1,111 @@
+import time
+import threading
+from amazon_invoices import profiling
+from amazon_invoices.checkpoint import Checkpoint, outcome_status
+from amazon_invoices.progress import ProgressTracker
+from amazon_invoices.pipeline import download_invoices
+
+# Jobs started in this process, by job ID. Module state outlives Streamlit reruns, so a
+# rerun (or a reconnecting tab) finds its job here still running and just polls it.
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+# One download_invoices run on a background thread, checkpointed to its download folder.
+# The tracker holds the progress a UI polls; the checkpoint is what a later job resumes from,
+# in this process or another one. With a SpanRecorder, stage timings are recorded for as long
+# as the job runs, and can be read from it while it does.
+class DownloadJob:
+    def __init__(self, checkpoint, email, password, verification_code=None, recorder=None, **runtime_options):
+        self.checkpoint = checkpoint
+        self.recorder = recorder
+        self.email = email
+        self._password = password
+        self._verification_code = verification_code
+        self._runtime_options = runtime_options
+        self.tracker = ProgressTracker(total=checkpoint.options.get('max_orders'))
+        self.stop_event = threading.Event()
+        self.result = None
+        self.started_at = None
+        self._thread = None
+    
+    @property
+    def job_id(self):
+        return self.checkpoint.job_id
+    
+    @property
+    def status(self):
+        return self.checkpoint.status
+    
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        self.started_at = time.time()
+        self.checkpoint.set_status('running')
+        self._thread = threading.Thread(target=self._run, name=f"download-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+    
+    # Function to ask the job to stop after the orders already in flight; it can be resumed later
+    def stop(self):
+        self.stop_event.set()
+    
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.result
+    
+    def _run(self):
+        options = dict(self.checkpoint.options, **self._runtime_options)
+        if self.recorder is not None:
+            profiling.enable(self.recorder)
+        try:
+            success, message = download_invoices(
+                self.email, self._password,
+                download_dir=self.checkpoint.download_dir,
+                verification_code=self._verification_code,
+                report=self.tracker.report,
+                on_progress=self.tracker.update,
+                checkpoint=self.checkpoint,
+                stop_event=self.stop_event,
+                **options
+            )
+        except Exception as e:
+            success, message = False, f"Unexpected error: {e}"
+        finally:
+            self._password = None
+            # Recording stops with the job, even if nobody is left watching it
+            if self.recorder is not None and profiling.active_recorder() is self.recorder:
+                profiling.disable()
+        
+        status = outcome_status(success, message, self.stop_event.is_set())
+        self.result = (success, message)
+        self.checkpoint.set_status(status, message)
+        self.tracker.report('success' if status == 'done' else 'warning' if success else 'error', message)
+
+# Function to start a download job for a new checkpoint, or resume a saved one.
+# options are the JSON-serialisable download_invoices settings stored in the checkpoint
+# (ignored when resuming, which reuses the saved ones); runtime_options such as
+# browser_pool are passed through without being saved.
+def start_job(email, password, download_dir=None, options=None, checkpoint=None, verification_code=None,
+              recorder=None, **runtime_options):
+    with _jobs_lock:
+        if checkpoint is not None:
+            existing = _jobs.get(checkpoint.job_id)
+            if existing is not None and existing.running:
+                return existing
+        else:
+            checkpoint = Checkpoint.create(download_dir, options, email)
+        
+        job = DownloadJob(checkpoint, email, password, verification_code, recorder, **runtime_options)
+        _jobs[job.job_id] = job
+    return job.start()
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def running_jobs():
+    with _jobs_lock:
+        return [job for job in _jobs.values() if job.running]
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+from amazon_invoices.blobstore import blob_exists
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+# Append-only index of the invoices already downloaded into a directory, keyed by order ID.
+# Each line is one JSON entry; later lines for the same order win, and a truncated
+# last line (e.g. from a crash mid-write) is ignored on load.
+class InvoiceManifest:
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.path = os.path.join(download_dir, MANIFEST_FILENAME)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._needs_newline = False
+        self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._needs_newline = not line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and entry.get('order_id'):
+                    self._entries[entry['order_id']] = entry
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, order_id):
+        return order_id in self._entries
+    
+    def get(self, order_id):
+        return self._entries.get(order_id)
+    
+    # An order counts as synced only if its file is still on disk with the recorded size,
+    # or, for invoices kept in the blob store, if their blob is still there
+    def is_synced(self, order_id, filename):
+        filepath = os.path.join(self.download_dir, filename)
+        entry = self._entries.get(order_id)
+        
+        if entry is not None and entry.get('blob'):
+            return blob_exists(self.download_dir, entry['sha256'])
+        
+        if entry is None:
+            # Invoices downloaded before the manifest existed are adopted as-is
+            if os.path.isfile(filepath):
+                self.record(order_id, filename, None, *file_digest(filepath))
+                return True
+            return False
+        
+        try:
+            return os.path.getsize(filepath) == entry['size']
+        except OSError:
+            return False
+    
+    def record(self, order_id, filename, url, size, sha256, blob=False):
+        entry = {
+            'order_id': order_id,
+            'file': filename,
+            'url': url,
+            'size': size,
+            'sha256': sha256,
+            'fetched_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        if blob:
+            entry['blob'] = True
+        line = json.dumps(entry) + '\n'
+        
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                # Don't glue the new entry onto a truncated last line
+                if self._needs_newline:
+                    f.write('\n')
+                    self._needs_newline = False
+                f.write(line)
+            self._entries[order_id] = entry
+        
+        return entry
+
+# Function to compute the size and SHA-256 of a file without reading it all at once
+def file_digest(filepath, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    size = 0
+    
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    
+    return size, digest.hexdigest()
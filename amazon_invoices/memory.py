@@ -0,0 +1,110 @@
+import os
+import sys
+import gc
+import tracemalloc
+
+# psutil is only needed for the current RSS where /proc isn't available (macOS, Windows)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Function to read this process's current resident set size in bytes; None if it can't be told
+def current_rss():
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+# Keeps the crawl under a resident memory budget. Intake is only slowed, never stopped:
+# once RSS is over the budget, the caller drains what is in flight and takes one order at a
+# time until it drops back under.
+class MemoryBudget:
+    def __init__(self, budget_mb, report):
+        self.budget = budget_mb * 1024 * 1024
+        self.report = report
+        self.throttled = 0
+        self._warned = False
+        if current_rss() is None:
+            report('warning', "⚠️ Can't read this process's memory use here (install psutil), so the memory budget is ignored.")
+            self.budget = None
+    
+    # Function to check the budget; True means take no more orders until the in-flight ones finish
+    def exceeded(self):
+        if self.budget is None:
+            return False
+        rss = current_rss()
+        if rss <= self.budget:
+            return False
+        
+        # Unreachable parse trees with reference cycles are the cheapest thing to give back
+        gc.collect()
+        rss = current_rss()
+        if rss <= self.budget:
+            return False
+        
+        self.throttled += 1
+        if not self._warned:
+            self._warned = True
+            self.report('warning', f"🐢 Memory use ({rss / 1024 / 1024:.0f} MB) is over the {self.budget / 1024 / 1024:.0f} MB "
+                                   "budget; downloading one order at a time until it drops.")
+        return True
+
+# Opt-in leak tracking: every `every` orders, a tracemalloc snapshot is compared with the
+# previous one and the source lines whose allocations grew most are reported.
+# Tracing slows Python allocations down noticeably, so it is meant for diagnosing long runs.
+class MemoryTracer:
+    def __init__(self, every, report, top=5, frames=1):
+        self.every = max(1, every)
+        self.report = report
+        self.top = top
+        self.orders = 0
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start(frames)
+        self._snapshot = self._take()
+    
+    def _take(self):
+        # The tracer's own allocations and the import machinery would only add noise
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+    
+    # Function to count one finished order, reporting growth every `every` orders
+    def tick(self):
+        self.orders += 1
+        if self.orders % self.every:
+            return
+        
+        snapshot = self._take()
+        growth = [stat for stat in snapshot.compare_to(self._snapshot, 'lineno') if stat.size_diff > 0][:self.top]
+        self._snapshot = snapshot
+        
+        traced, _ = tracemalloc.get_traced_memory()
+        rss = current_rss()
+        lines = [f"🧠 After {self.orders} orders: {traced / 1024 / 1024:.1f} MB traced"
+                 + (f", RSS {rss / 1024 / 1024:.0f} MB" if rss is not None else "")
+                 + (". Largest growth since the last check:" if growth else "; no growth since the last check.")]
+        for stat in growth:
+            frame = stat.traceback[0]
+            lines.append(f"  {_short_path(frame.filename)}:{frame.lineno}  +{stat.size_diff / 1024:.1f} KiB "
+                         f"({stat.count_diff:+d} blocks)")
+        self.report('info', "\n".join(lines))
+    
+    def close(self):
+        self._snapshot = None
+        if self._started:
+            tracemalloc.stop()
+
+def _short_path(filename):
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
@@ -0,0 +1,538 @@
+import os
+import re
+import datetime
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from amazon_invoices.files import stream_to_file, write_bytes, DOWNLOAD_CHUNK_SIZE
+from amazon_invoices.blobstore import BlobStore
+from amazon_invoices.manifest import InvoiceManifest
+from amazon_invoices.report import log_report
+from amazon_invoices.profiling import span
+from amazon_invoices.invoice_data import extract_card_summary, extract_invoice_record
+from amazon_invoices.parsing import (
+    parse_html, find_order_cards, extract_order_id, classify_links,
+    find_printable_link, find_next_page, text_lines
+)
+
+# Raised when the order history itself can't be read
+class OrdersPageError(Exception):
+    pass
+
+# Function to add Amazon's time-period filter (e.g. "year-2023", "months-3") to an orders URL
+def apply_time_filter(orders_url, time_filter):
+    if not time_filter:
+        return orders_url
+    
+    parts = urlsplit(orders_url)
+    query = dict(parse_qsl(parts.query))
+    
+    # The newer "your-orders" pages use timeFilter, the classic order history uses orderFilter
+    param = 'timeFilter' if 'your-orders' in parts.path else 'orderFilter'
+    query[param] = time_filter
+    query.pop('startIndex', None)
+    
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+# Function to check a date range before crawling it; returns why no order can be in it
+# (it ends before it starts, or starts in the future), or None if it is fine
+def date_range_error(since=None, until=None):
+    if since is None:
+        return None
+    if until is not None and since > until:
+        return f"The date range ends ({until}) before it starts ({since})."
+    if since > datetime.date.today():
+        return f"The date range starts in the future ({since})."
+    return None
+
+# Function to list the time-period filters that cover a date range, newest first: one
+# "year-YYYY" view per year, so pages from outside the range are never requested.
+# Without a start date there's nothing to bound the walk, so the whole history is used.
+# Raises ValueError for a range no order can be in (see date_range_error).
+def date_range_filters(since=None, until=None):
+    if since is None:
+        return [None]
+    error = date_range_error(since, until)
+    if error is not None:
+        raise ValueError(error)
+    last_year = (until or datetime.date.today()).year
+    return [f"year-{year}" for year in range(last_year, since.year - 1, -1)]
+
+# Function to tell which order-history page iter_orders requests first with these arguments
+def first_page_url(orders_url, time_filter=None, since=None, until=None, resume=None):
+    if resume is not None:
+        return resume['page_url']
+    periods = date_range_filters(since, until) if since is not None or until is not None else [time_filter]
+    return apply_time_filter(orders_url, periods[0])
+
+# Function to turn an order card into a small, self-contained order record
+def extract_order_record(container, index, base_url):
+    # Extract order ID
+    raw_order_id = extract_order_id(container)
+    order_id = raw_order_id or f"Order-{index+1}"
+    
+    # Clean up order ID (remove extra text)
+    order_id = re.sub(r'Order #', '', order_id).strip()
+    order_id = re.sub(r'\s+', '-', order_id)
+    
+    links = classify_links(container, base_url)
+    
+    record = {
+        'index': index,
+        'order_id': order_id,
+        'has_order_id': raw_order_id is not None,
+        'invoice_links': links['invoice'],
+        'details_link': links['details'][0] if links['details'] else None
+    }
+    
+    # Placed-on date, total and product titles, as shown on the card itself
+    record.update(extract_card_summary(container))
+    return record
+
+# Generator that walks the order history page by page and yields order records lazily.
+# Only one page is held in memory at a time, and the next page is requested only
+# once the caller has consumed every order on the current one.
+# With since/until (dates, either may be None) only orders placed in that range are yielded:
+# the history is read through the year filters covering it, and since it is listed newest
+# first, paging stops at the first order placed before since. Orders whose date couldn't be
+# read from their card are kept.
+# Each record carries a 'cursor' saying where in the history it was found; passing one back
+# as resume (with the same filters) continues the walk from that order.
+def iter_orders(session, orders_url, max_orders=None, time_filter=None, since=None, until=None, resume=None,
+                report=log_report):
+    in_range = since is not None or until is not None
+    position = 0
+    yielded = 0
+    seen_ids = set()
+    skip = 0
+    
+    for period_index, period in enumerate(date_range_filters(since, until) if in_range else [time_filter]):
+        page_url = apply_time_filter(orders_url, period)
+        
+        if resume is not None:
+            if period_index < resume['period']:
+                continue
+            page_url, skip = resume['page_url'], resume['offset']
+            position, yielded = resume['position'] - skip, resume['yielded']
+            resume = None
+        
+        while page_url:
+            with span('orders_page') as page_span:
+                response = session.get(page_url)
+                page_span.record_response(response)
+            
+            if response.status_code != 200:
+                if yielded == 0:
+                    raise OrdersPageError(f"Failed to load orders page. Status code: {response.status_code}")
+                report('warning', f"⚠️ Stopped paging at {page_url} (status code {response.status_code}).")
+                return
+            
+            with span('orders_page.parse') as parse_span:
+                root = parse_html(response.content)
+                
+                # Try different selectors for order containers
+                order_containers = find_order_cards(root)
+                parse_span.set(orders=len(order_containers))
+            
+            # The body isn't needed once parsed; don't keep it alive while this generator is suspended
+            response_url = response.url
+            response.close()
+            del response
+            
+            if not order_containers:
+                # A year without orders is expected in a date range; anywhere else it means the layout changed
+                if position == 0 and not in_range:
+                    raise OrdersPageError("Could not find any orders on the page. Amazon may have changed their page layout.")
+                break
+            
+            records = []
+            for offset, container in enumerate(order_containers):
+                record = extract_order_record(container, position, response_url)
+                record['cursor'] = {'period': period_index, 'page_url': page_url, 'offset': offset, 'position': position}
+                records.append(record)
+                position += 1
+            
+            # Amazon silently serves the last page again for out-of-range startIndex values
+            if all(record['order_id'] in seen_ids for record in records):
+                break
+            
+            page_url = find_next_page(root, response_url)
+            
+            # Drop the parse tree before handing out records
+            del root, order_containers
+            
+            # When resuming, the orders before the cursor on its page were handled last time
+            records, skip = records[skip:], 0
+            
+            for record in records:
+                if max_orders and yielded >= max_orders:
+                    return
+                
+                record['cursor']['yielded'] = yielded
+                seen_ids.add(record['order_id'])
+                order_date = record['order_date']
+                if order_date is not None and until is not None and order_date > until:
+                    continue
+                if order_date is not None and since is not None and order_date < since:
+                    report('info', f"🗓️ Reached orders placed before {since:%B %d, %Y}; stopping.")
+                    return
+                
+                yield record
+                yielded += 1
+
+# Function to build the file name an order's invoice is saved under
+def invoice_filename(order_id):
+    return f"Amazon_Invoice_{order_id}.pdf"
+
+# Function to process a single order record (runs on a worker thread, so it
+# collects its messages instead of writing to the page directly).
+# With a BlobStore, a PDF invoice goes into it rather than into download_dir.
+def process_order(session, record, download_dir, manifest=None, render_pdfs=False, extract_data=False, store=None):
+    order_id = record['order_id']
+    result = {'index': record['index'], 'order_id': order_id, 'status': 'error', 'events': [], 'html': None,
+              'source_url': None, 'invoice_data': None}
+    events = result['events']
+    order_span = span('order', order_id=order_id).start()
+    
+    # Visible text of the pages the order's typed record is read from, most detailed first.
+    # Only the text is kept, so each parse tree can go as soon as its links have been read.
+    data_pages = []
+    
+    try:
+        events.append(('info', f"🔍 Processing order: {order_id}"))
+        
+        # Find invoice link
+        invoice_link = None
+        invoice_links = list(record['invoice_links'])
+        
+        if not invoice_links and record['details_link']:
+            # Visit order details page to find invoice link
+            with span('order.details') as hop_span:
+                details_response = session.get(record['details_link'])
+                hop_span.record_response(details_response)
+                details_root = parse_html(details_response.content)
+                invoice_links = classify_links(details_root, details_response.url)['invoice']
+                del details_root, details_response
+        
+        if not invoice_links:
+            events.append(('warning', f"⚠️ No invoice link found for order {order_id}. Skipping."))
+            result['status'] = 'skipped'
+            return result
+        
+        # Visit the first invoice link
+        invoice_link = invoice_links[0]
+        events.append(('info', f"📄 Found invoice link for order {order_id}"))
+        
+        with span('order.invoice') as hop_span:
+            invoice_response = session.get(invoice_link)
+            hop_span.record_response(invoice_response)
+            invoice_root = parse_html(invoice_response.content)
+            
+            # Look for printable order summary link
+            printable_link = find_printable_link(invoice_root, invoice_response.url)
+            
+            if extract_data:
+                data_pages.append(text_lines(invoice_root))
+            del invoice_root, invoice_response
+        
+        if not printable_link:
+            events.append(('warning', f"⚠️ No printable summary link found for order {order_id}. Skipping."))
+            result['status'] = 'skipped'
+            return result
+        
+        # Download the printable order summary
+        events.append(('info', f"📥 Downloading invoice for order {order_id}"))
+        
+        with span('order.summary') as hop_span:
+            summary_response = session.get(printable_link, stream=True)
+            hop_span.record_response(summary_response)
+        
+        try:
+            if summary_response.status_code != 200:
+                events.append(('error', f"❌ Failed to download invoice for order {order_id}. Status code: {summary_response.status_code}"))
+                return result
+            
+            # Check if it's a PDF or HTML before reading any of the body
+            content_type = summary_response.headers.get('Content-Type', '').lower()
+            
+            filename = invoice_filename(order_id)
+            filepath = os.path.join(download_dir, filename)
+            
+            if 'pdf' in content_type:
+                # Direct PDF download, streamed to disk
+                with span('pdf_write') as write_span:
+                    if store is not None:
+                        entry = store.put_stream(order_id, filename, summary_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE),
+                                                 order_date=record.get('order_date'))
+                        size, sha256 = entry['size'], entry['sha256']
+                    else:
+                        size, sha256 = stream_to_file(summary_response, filepath)
+                    write_span.set(bytes=size)
+                
+                if manifest is not None:
+                    manifest.record(order_id, filename, printable_link, size, sha256, blob=store is not None)
+            else:
+                # It's HTML that should be printed to PDF
+                result['html'] = summary_response.text
+                result['source_url'] = printable_link
+                
+                if extract_data:
+                    data_pages.insert(0, text_lines(parse_html(result['html'])))
+                
+                if render_pdfs:
+                    events.append(('info', f"📄 Fetched HTML for order {order_id}. Queued for PDF rendering."))
+                else:
+                    # Let the user know they need to print it manually
+                    events.append(('info', f"📄 Fetched HTML for order {order_id}. You'll need to open and print it to PDF manually."))
+                
+                result['status'] = 'html'
+                return result
+        finally:
+            summary_response.close()
+        
+        events.append(('success', f"✅ Successfully downloaded invoice for order {order_id}"))
+        result['status'] = 'downloaded'
+    
+    except Exception as e:
+        events.append(('error', f"❌ Error processing order {record['index']+1}: {str(e)}"))
+    finally:
+        if extract_data:
+            try:
+                source = 'summary' if result['source_url'] is not None else None
+                result['invoice_data'] = extract_invoice_record(record, data_pages, source=source)
+            except Exception as e:
+                events.append(('warning', f"⚠️ Couldn't read the order details of {order_id}: {e}"))
+        order_span.set(status=result['status'])
+        order_span.finish()
+    
+    return result
+
+# Function to build the file name an HTML summary is saved under when it isn't rendered to PDF
+def summary_filename(order_id):
+    return f"Amazon_Order_{order_id}.html"
+
+# Running totals handed to on_progress: orders found in the history, queued for download,
+# completed, and how each completed one ended
+ORDER_COUNTS = ('found', 'queued', 'completed', 'downloaded', 'html', 'skipped', 'errors', 'already_synced', 'rendered')
+STATUS_COUNTS = {'downloaded': 'downloaded', 'html': 'html', 'skipped': 'skipped', 'error': 'errors'}
+
+# Function to fetch and process orders.
+# Progress goes to report(level, message). HTML summaries that aren't rendered to PDF are
+# passed to on_html(order_id, html) when given, and saved next to the invoices otherwise.
+# With extract_data, each order's date, items and totals are also appended to the
+# download folder's Parquet dataset (see amazon_invoices.dataset). on_progress(counts), when
+# given, is called with the running ORDER_COUNTS totals every time an order completes.
+# since/until restrict the crawl to orders placed in that date range (see iter_orders) and
+# take the place of time_filter.
+# With a checkpoint (see amazon_invoices.checkpoint) the crawl resumes from its cursor, first
+# retrying the orders that failed last time, and keeps it up to date as orders finish.
+# Setting stop_event stops it after the orders already in flight.
+# storage='blobs' keeps invoices and summaries in the folder's deduplicated, compressed
+# BlobStore instead of as loose files.
+# memory_budget_mb caps resident memory by taking fewer orders at once while it is exceeded,
+# and trace_memory_every=N reports where memory grew every N orders (see amazon_invoices.memory).
+def fetch_amazon_orders(session, orders_url, download_dir, max_orders=None, max_workers=1, time_filter=None,
+                        since=None, until=None, skip_synced=True, stop_at_synced=False, render_pdfs=False,
+                        render_workers=None, extract_data=True, report=log_report, on_html=None, on_progress=None,
+                        checkpoint=None, stop_event=None, storage='files', memory_budget_mb=None,
+                        trace_memory_every=None):
+    renderer = None
+    dataset = None
+    tracer = None
+    try:
+        orders_processed = 0
+        successful_downloads = 0
+        already_synced = 0
+        os.makedirs(download_dir, exist_ok=True)
+        
+        # Orders already in the download manifest are skipped before any of their pages are requested
+        manifest = InvoiceManifest(download_dir) if skip_synced else None
+        store = BlobStore(download_dir) if storage == 'blobs' else None
+        
+        budget = None
+        if memory_budget_mb or trace_memory_every:
+            from amazon_invoices.memory import MemoryBudget, MemoryTracer
+            budget = MemoryBudget(memory_budget_mb, report) if memory_budget_mb else None
+            tracer = MemoryTracer(trace_memory_every, report) if trace_memory_every else None
+        
+        # Orders are downloaded on a pool of worker threads, but results are
+        # collected strictly in submission order so the page reads top to bottom.
+        # Only a small window of orders is in flight at any time, and the order
+        # history is paged in lazily as that window drains.
+        window = max(1, max_workers) * 2
+        pending = deque()
+        counts = dict.fromkeys(ORDER_COUNTS, 0)
+        
+        def progress():
+            if on_progress is not None:
+                on_progress(dict(counts))
+        
+        # The checkpoint cursor is the oldest order still in flight, or the one after the last
+        # order read from the history once everything before it is done
+        last_cursor = None
+        
+        def save_cursor():
+            if checkpoint is None:
+                return
+            for queued, _ in pending:
+                if queued.get('cursor') is not None:
+                    checkpoint.advance(queued['cursor'])
+                    return
+            if last_cursor is not None:
+                checkpoint.advance(dict(last_cursor, offset=last_cursor['offset'] + 1,
+                                        position=last_cursor['position'] + 1, yielded=last_cursor['yielded'] + 1))
+        
+        if extract_data:
+            from amazon_invoices.dataset import InvoiceDataset, DATASET_DIRNAME, is_available as dataset_available
+            if dataset_available():
+                dataset = InvoiceDataset(os.path.join(download_dir, DATASET_DIRNAME))
+            else:
+                report('warning', "⚠️ pyarrow isn't installed, so order details won't be recorded for spend reports.")
+        
+        def collect(record, future):
+            nonlocal orders_processed, successful_downloads, renderer
+            result = future.result()
+            
+            if checkpoint is not None and result['status'] == 'error':
+                checkpoint.add_retry(record)
+            
+            # HTML summaries are converted to PDF in the background while the crawl continues.
+            # Chrome is only started once the first one turns up; most summaries are PDFs already.
+            if render_pdfs and result['html'] is not None:
+                if renderer is None:
+                    from amazon_invoices.pdf_renderer import PdfRenderer
+                    renderer = PdfRenderer(workers=render_workers, manifest=manifest, store=store)
+                
+                filepath = os.path.join(download_dir, invoice_filename(result['order_id']))
+                renderer.submit(result['index'], result['order_id'], result['html'], filepath, result['source_url'],
+                                record.get('order_date'))
+                result['html'] = None
+            
+            for level, message in result['events']:
+                report(level, message)
+            
+            if dataset is not None and result['invoice_data'] is not None:
+                dataset.add(result['invoice_data'])
+            
+            if result['html'] is not None:
+                if on_html is not None:
+                    on_html(result['order_id'], result['html'])
+                elif store is not None:
+                    store.put_bytes(result['order_id'], summary_filename(result['order_id']), result['html'].encode('utf-8'),
+                                    compress=True, order_date=record.get('order_date'))
+                    report('info', f"💾 Saved HTML summary of order {result['order_id']} (compressed)")
+                else:
+                    html_path = os.path.join(download_dir, summary_filename(result['order_id']))
+                    write_bytes(html_path, result['html'].encode('utf-8'))
+                    report('info', f"💾 Saved HTML summary to {html_path}")
+            
+            if result['status'] == 'downloaded':
+                successful_downloads += 1
+            # Orders whose summary came back as HTML count too, whether it was rendered or saved as is
+            if result['status'] != 'skipped':
+                orders_processed += 1
+            
+            counts['completed'] += 1
+            counts[STATUS_COUNTS[result['status']]] += 1
+            progress()
+            
+            if tracer is not None:
+                tracer.tick()
+        
+        # Orders that failed last time go first; they were already counted as read from the history
+        records = iter_orders(session, orders_url, max_orders=max_orders, time_filter=time_filter,
+                              since=since, until=until, resume=checkpoint.cursor if checkpoint else None, report=report)
+        if checkpoint is not None:
+            retries = [dict(record, cursor=None) for record in checkpoint.take_retries()]
+            if retries:
+                report('info', f"🔁 Retrying {len(retries)} orders that failed last time.")
+            records = itertools.chain(retries, records)
+        
+        stopped = False
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for record in records:
+                if stop_event is not None and stop_event.is_set():
+                    stopped = True
+                    break
+                
+                counts['found'] += 1
+                last_cursor = record['cursor'] or last_cursor
+                if (manifest is not None and record['has_order_id'] and
+                        manifest.is_synced(record['order_id'], invoice_filename(record['order_id']))):
+                    already_synced += 1
+                    counts['already_synced'] += 1
+                    progress()
+                    save_cursor()
+                    
+                    # Order history is newest first, so everything past here was synced on an earlier run
+                    if stop_at_synced:
+                        break
+                    continue
+                
+                # Over the memory budget, everything in flight finishes before another order is taken
+                if budget is not None and pending and budget.exceeded():
+                    while pending:
+                        collect(*pending.popleft())
+                    save_cursor()
+                
+                counts['queued'] += 1
+                pending.append((record, executor.submit(process_order, session, record, download_dir, manifest,
+                                                        render_pdfs, dataset is not None, store)))
+                if len(pending) >= window:
+                    collect(*pending.popleft())
+                    save_cursor()
+            
+            while pending:
+                collect(*pending.popleft())
+                save_cursor()
+        
+        if renderer is not None:
+            rendered_results, renderer = renderer.close(), None
+            for rendered in rendered_results:
+                if rendered['error'] is None:
+                    report('success', f"🖨️ Rendered PDF invoice for order {rendered['order_id']}")
+                    successful_downloads += 1
+                    counts['rendered'] += 1
+                elif rendered['filepath']:
+                    report('warning', f"⚠️ Couldn't render PDF for order {rendered['order_id']} ({rendered['error']}). Saved the HTML to {rendered['filepath']}.")
+                else:
+                    report('error', f"❌ Couldn't render PDF for order {rendered['order_id']}: {rendered['error']}")
+        
+        progress()
+        
+        message = f"Processed {orders_processed} orders with {successful_downloads} successful downloads."
+        if already_synced:
+            message += f" Skipped {already_synced} already downloaded."
+        if budget is not None and budget.throttled:
+            message += f" Slowed down {budget.throttled} times to stay within the memory budget."
+        if stopped:
+            message = "⏸️ Stopped early. " + message
+        return True, message
+    
+    except OrdersPageError as e:
+        return False, str(e)
+    except Exception as e:
+        return False, f"Error fetching orders: {str(e)}"
+    finally:
+        # Don't leave renderer browsers running if the crawl failed part way
+        if renderer is not None:
+            renderer.close()
+        
+        if tracer is not None:
+            tracer.close()
+        
+        # A crawl that failed part way resumes from the last order it finished
+        if checkpoint is not None:
+            try:
+                checkpoint.save()
+            except OSError as e:
+                report('warning', f"⚠️ Couldn't save the download checkpoint: {e}")
+        
+        # Keep whatever order data was gathered, even from a crawl that failed part way
+        if dataset is not None:
+            try:
+                dataset.flush()
+            except Exception as e:
+                report('warning', f"⚠️ Couldn't save order details for spend reports: {e}")
+
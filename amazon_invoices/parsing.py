@@ -0,0 +1,148 @@
+import re
+from urllib.parse import urljoin
+from lxml import etree, html
+
+# Parsing helpers for Amazon's order pages, built on lxml instead of BeautifulSoup's
+# pure-Python html.parser. Every query is an XPath compiled once at import time, and
+# anchors are classified in a single walk over the part of the tree that matters.
+
+_PARSER = html.HTMLParser(remove_comments=True, remove_pis=True, collect_ids=False)
+
+# Function to build an XPath predicate matching a single CSS class, like ".order"
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+ORDER_CARD_XPATHS = [
+    etree.XPath(f"//*[{_has_class('order')}]"),
+    etree.XPath(f"//*[{_has_class('js-order-card')}]"),
+    etree.XPath(f"//*[{_has_class('order-card')}]"),
+]
+ORDER_ID_XPATH = etree.XPath(
+    f"(.//*[{_has_class('order-info')}]//*[{_has_class('value')}]"
+    f" | .//*[{_has_class('order-id')}]"
+    f" | .//*[{_has_class('yo-orderid')}]"
+    f" | .//*[@data-test-id='order-id-container'])[1]"
+)
+NEXT_PAGE_XPATH = etree.XPath(f"(//*[{_has_class('a-pagination')}]//*[{_has_class('a-last')}])[1]")
+PRINT_BUTTON_XPATH = etree.XPath("(//input[@type='submit'][contains(@value, 'Print')] | //button[contains(., 'Print')])[1]")
+ACCOUNT_NAV_XPATH = etree.XPath("//*[@id='nav-link-accountList' or @id='nav-tools']")
+ACCOUNT_NAME_XPATH = etree.XPath(f"(//*[@id='nav-link-accountList-nav-line-1'] | //*[{_has_class('nav-line-1')}])[1]")
+PRODUCT_LINK_XPATH = etree.XPath(".//a[contains(@href, '/dp/') or contains(@href, '/gp/product/')]")
+VISIBLE_TEXT_XPATH = etree.XPath(
+    ".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::noscript)]"
+)
+
+INVOICE_RE = re.compile(r'invoice|receipt')
+DETAILS_TEXT_RE = re.compile(r'details|view order')
+PRINT_TEXT_RE = re.compile(r'print')
+SUMMARY_TEXT_RE = re.compile(r'summary|invoice')
+POPOVER_TEXT_RE = re.compile(r'print|summary|invoice')
+
+# Function to parse a page; accepts bytes (lets lxml honour the declared charset) or text
+def parse_html(content):
+    if not content or not content.strip():
+        return html.Element('html')
+    
+    try:
+        return html.document_fromstring(content, parser=_PARSER)
+    except (etree.ParserError, ValueError):
+        return html.Element('html')
+
+# Function to find the order cards on an order-history page
+def find_order_cards(root):
+    for xpath in ORDER_CARD_XPATHS:
+        cards = xpath(root)
+        if cards:
+            return cards
+    return []
+
+def extract_order_id(card):
+    found = ORDER_ID_XPATH(card)
+    return found[0].text_content().strip() if found else None
+
+# Function to classify every anchor under a node in a single pass.
+# Returns absolute URLs grouped by kind; an anchor can fall into more than one kind
+# (e.g. "Print invoice" is both an invoice link and a print-summary link).
+def classify_links(node, base_url):
+    links = {'invoice': [], 'details': [], 'print_summary': [], 'popover': []}
+    
+    for anchor in node.iter('a'):
+        href = anchor.get('href') or ''
+        href_lower = href.lower()
+        text = anchor.text_content().lower()
+        url = urljoin(base_url, href)
+        
+        if INVOICE_RE.search(text) or INVOICE_RE.search(href_lower):
+            links['invoice'].append(url)
+        
+        if DETAILS_TEXT_RE.search(text) or 'order-details' in href:
+            links['details'].append(url)
+        
+        if PRINT_TEXT_RE.search(text) and SUMMARY_TEXT_RE.search(text) or 'print-summary' in href:
+            links['print_summary'].append(url)
+        
+        # Only anchors that look relevant pay for the ancestor check
+        if href and POPOVER_TEXT_RE.search(text) and _in_popover(anchor):
+            links['popover'].append(url)
+    
+    return links
+
+def _in_popover(element):
+    for ancestor in element.iterancestors():
+        if 'a-popover-content' in (ancestor.get('class') or '').split() or ancestor.get('data-action') == 'a-popover':
+            return True
+    return False
+
+# Function to find the printable order summary link on an invoice page
+def find_printable_link(root, base_url, links=None):
+    links = links if links is not None else classify_links(root, base_url)
+    
+    # Method 1: Direct link in a popover
+    if links['popover']:
+        return links['popover'][0]
+    
+    # Method 2: From "Print Order Summary" button; this might be a form submission, so use the form action
+    buttons = PRINT_BUTTON_XPATH(root)
+    if buttons:
+        for ancestor in buttons[0].iterancestors('form'):
+            if ancestor.get('action'):
+                return urljoin(base_url, ancestor.get('action'))
+            break
+    
+    # Method 3: Directly from page links
+    if links['print_summary']:
+        return links['print_summary'][0]
+    
+    return None
+
+# Function to find the URL of the next order-history page, if there is one
+def find_next_page(root, base_url):
+    found = NEXT_PAGE_XPATH(root)
+    if not found or 'a-disabled' in (found[0].get('class') or '').split():
+        return None
+    
+    for anchor in found[0].iter('a'):
+        if anchor.get('href'):
+            return urljoin(base_url, anchor.get('href'))
+    return None
+
+# Function to list a node's visible text, one stripped string per text node
+def text_lines(node):
+    return [text for text in (raw.strip() for raw in VISIBLE_TEXT_XPATH(node)) if text]
+
+# Function to list the product titles linked from an order card
+def find_item_titles(card):
+    titles = []
+    for anchor in PRODUCT_LINK_XPATH(card):
+        title = ' '.join(anchor.text_content().split())
+        if title and title not in titles:
+            titles.append(title)
+    return titles
+
+# Function to find the signed-in account name in the navigation bar; None if not signed in
+def find_account_name(root):
+    if not ACCOUNT_NAV_XPATH(root):
+        return None
+    
+    found = ACCOUNT_NAME_XPATH(root)
+    return found[0].text_content().strip() if found else "User"
@@ -0,0 +1,151 @@
+import os
+import re
+import base64
+import time
+import queue
+import threading
+from html import escape
+from amazon_invoices.browser import BrowserPool
+from amazon_invoices.files import write_bytes
+from amazon_invoices.profiling import span
+
+PRINT_OPTIONS = {
+    'printBackground': True,
+    'preferCSSPageSize': True,
+}
+
+HEAD_TAG_RE = re.compile(r'<head[^>]*>', re.IGNORECASE)
+
+# Seconds to wait for a summary's stylesheets and images before printing it anyway
+LOAD_TIMEOUT = 15.0
+LOAD_POLL_INTERVAL = 0.05
+
+# Function to make relative stylesheet and image URLs in a saved summary resolve against Amazon
+def _with_base_url(html, base_url):
+    base_tag = f'<base href="{escape(base_url)}">'
+    match = HEAD_TAG_RE.search(html)
+    if match:
+        return html[:match.end()] + base_tag + html[match.end():]
+    return base_tag + html
+
+# Function to wait until the current tab's document and its subresources have loaded.
+# Returns False if it gave up after timeout seconds.
+def wait_for_load(driver, timeout=LOAD_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while driver.execute_script("return document.readyState") != 'complete':
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(LOAD_POLL_INTERVAL)
+    return True
+
+# Function to render an HTML document to PDF bytes in an already-open browser tab
+def render_pdf(driver, html, base_url=None, load_timeout=LOAD_TIMEOUT):
+    if base_url:
+        html = _with_base_url(html, base_url)
+    
+    # Load the document straight into the current tab instead of going through a file or data: URL
+    frame_id = driver.execute_cdp_cmd('Page.getFrameTree', {})['frameTree']['frame']['id']
+    driver.execute_cdp_cmd('Page.setDocumentContent', {'frameId': frame_id, 'html': html})
+    
+    # setDocumentContent returns once the HTML is parsed, before the stylesheets and images it
+    # refers to (through the base URL) have arrived; a slow one is printed without, not waited on forever
+    with span('pdf_render.load'):
+        wait_for_load(driver, load_timeout)
+    
+    pdf = driver.execute_cdp_cmd('Page.printToPDF', PRINT_OPTIONS)
+    return base64.b64decode(pdf['data'])
+
+# Background HTML-to-PDF renderer for printable order summaries.
+# A fixed number of worker threads each hold one headless Chrome from a BrowserPool and
+# reuse its tab for every document. The job queue is bounded, so submit() blocks when
+# the renderers fall behind instead of piling summaries up in memory.
+# With a BlobStore, PDFs go into it under the file name's base name instead of to filepath.
+class PdfRenderer:
+    def __init__(self, workers=None, browser_pool=None, queue_size=None, manifest=None, store=None):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._owns_pool = browser_pool is None
+        self._pool = browser_pool or BrowserPool(size=self.workers)
+        self._manifest = manifest
+        self._store = store
+        self._queue = queue.Queue(maxsize=queue_size or self.workers * 2)
+        self._results = []
+        self._results_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+    
+    def submit(self, index, order_id, html, filepath, source_url=None, order_date=None):
+        self._queue.put((index, order_id, html, filepath, source_url, order_date))
+    
+    def _work(self):
+        driver = None
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                
+                result = self._render(job, driver)
+                driver = result.pop('driver')
+                with self._results_lock:
+                    self._results.append(result)
+        finally:
+            if driver is not None:
+                self._pool.release(driver)
+    
+    def _render(self, job, driver):
+        index, order_id, html, filepath, source_url, order_date = job
+        result = {'index': index, 'order_id': order_id, 'filepath': filepath, 'error': None}
+        filename = os.path.basename(filepath)
+        
+        try:
+            if driver is None:
+                with span('pdf_render.browser'):
+                    driver = self._pool.acquire()
+            
+            with span('pdf_render', order_id=order_id) as render_span:
+                pdf = render_pdf(driver, html, source_url)
+                if self._store is not None:
+                    entry = self._store.put_bytes(order_id, filename, pdf, order_date=order_date)
+                    size, sha256 = entry['size'], entry['sha256']
+                else:
+                    size, sha256 = write_bytes(filepath, pdf)
+                render_span.set(bytes=size)
+            
+            if self._manifest is not None:
+                self._manifest.record(order_id, filename, source_url, size, sha256, blob=self._store is not None)
+        except Exception as e:
+            result['error'] = str(e)
+            
+            # Hand a possibly broken browser back; the pool replaces it if it is unusable
+            if driver is not None:
+                self._pool.release(driver)
+                driver = None
+            
+            # Keep the summary so nothing is lost when rendering fails
+            html_path = os.path.splitext(filepath)[0] + '.html'
+            try:
+                if self._store is not None:
+                    self._store.put_bytes(order_id, os.path.basename(html_path), html.encode('utf-8'),
+                                          compress=True, order_date=order_date)
+                    html_path = f"{os.path.basename(html_path)} in {self._store.directory}"
+                else:
+                    write_bytes(html_path, html.encode('utf-8'))
+                result['filepath'] = html_path
+            except OSError:
+                result['filepath'] = None
+        
+        result['driver'] = driver
+        return result
+    
+    # Function to wait for every queued document; returns the results in submission order
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        
+        if self._owns_pool:
+            self._pool.close()
+        
+        return sorted(self._results, key=lambda result: result['index'])
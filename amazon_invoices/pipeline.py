@@ -0,0 +1,77 @@
+import os
+from amazon_invoices import cookie_cache
+from amazon_invoices.report import log_report
+from amazon_invoices.auth import extract_amazon_cookies, create_session_with_cookies, session_is_valid, verify_amazon_login
+from amazon_invoices.http_cache import CACHE_DIRNAME
+from amazon_invoices.orders import fetch_amazon_orders, first_page_url
+
+DEFAULT_ORDERS_URL = "https://www.amazon.com/gp/your-account/order-history"
+DEFAULT_DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "amazon_invoices")
+
+# Function to run the whole flow for one account: reuse or create a signed-in session,
+# verify it, then crawl the order history. Extra keyword arguments go to fetch_amazon_orders.
+# Returns (success, message); the message is "2FA_REQUIRED" when a verification code is needed.
+def download_invoices(email, password, orders_url=DEFAULT_ORDERS_URL, download_dir=DEFAULT_DOWNLOAD_DIR,
+                      verification_code=None, remember_session=True, browser_pool=None, use_http_cache=True,
+                      max_per_host=4, max_workers=4, requests_per_second=5.0, screenshot_dir=None,
+                      report=log_report, **fetch_options):
+    os.makedirs(download_dir, exist_ok=True)
+    
+    # The crawl can reuse the login check's page only if it starts there: not with a time
+    # filter, a date range or a checkpoint to resume from. A date range no order can be in
+    # is turned down here, before signing in.
+    checkpoint = fetch_options.get('checkpoint')
+    try:
+        crawl_url = first_page_url(orders_url, fetch_options.get('time_filter'), fetch_options.get('since'),
+                                   fetch_options.get('until'), checkpoint.cursor if checkpoint is not None else None)
+    except ValueError as e:
+        return False, str(e)
+    
+    session_options = {
+        'max_per_host': max_per_host,
+        'max_workers': max_workers,
+        'requests_per_second': requests_per_second or None,
+        'cache_dir': os.path.join(download_dir, CACHE_DIRNAME) if use_http_cache else None,
+        'cache_scope': email
+    }
+    session = None
+    
+    # Reuse a cached session if it is still signed in
+    if remember_session:
+        cached_cookies = cookie_cache.load_cookies(email, password)
+        if cached_cookies:
+            cached_session = create_session_with_cookies(cached_cookies, **session_options)
+            if session_is_valid(cached_session, orders_url):
+                session = cached_session
+                report('success', "✅ Reused saved Amazon session!")
+            else:
+                cookie_cache.clear_cookies(email)
+    
+    # Extract cookies
+    if session is None:
+        cookies_dict, message = extract_amazon_cookies(
+            email, password, verification_code,
+            cache_cookies=remember_session,
+            browser_pool=browser_pool,
+            screenshot_dir=screenshot_dir,
+            report=report
+        )
+        
+        if message == "2FA_REQUIRED":
+            return False, message
+        if not cookies_dict:
+            return False, f"Failed to extract cookies: {message}"
+        
+        report('success', "✅ Successfully extracted Amazon cookies!")
+        session = create_session_with_cookies(cookies_dict, **session_options)
+    
+    # Verify login
+    logged_in, login_message = verify_amazon_login(session, orders_url, prime=crawl_url == orders_url)
+    if not logged_in:
+        cookie_cache.clear_cookies(email)
+        return False, login_message
+    
+    report('success', login_message)
+    
+    # Fetch and download invoices
+    return fetch_amazon_orders(session, orders_url, download_dir, max_workers=max_workers, report=report, **fetch_options)
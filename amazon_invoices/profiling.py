@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque, Counter
+
+# Upper bounds, in seconds, of the per-stage latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Raw spans kept for JSON lines export; the per-stage aggregates are never truncated
+DEFAULT_MAX_SPANS = 100000
+
+METRIC_PREFIX = "amazon_invoices"
+
+# The recorder spans go to; None means profiling is off and span() hands out a shared no-op
+_recorder = None
+
+# Function to start recording spans; returns the recorder, which can be exported afterwards
+def enable(recorder=None):
+    global _recorder
+    _recorder = recorder or SpanRecorder()
+    return _recorder
+
+# Function to stop recording spans; returns the recorder that was active, if any
+def disable():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+def active_recorder():
+    return _recorder
+
+# Function to time one stage: "with span('order.invoice') as s: ..." records its wall time,
+# plus whatever s.set(...) or s.record_response(...) attached to it. Costs one global
+# lookup when profiling is off.
+def span(stage, **attrs):
+    recorder = _recorder
+    if recorder is None:
+        return NULL_SPAN
+    return Span(recorder, stage, attrs)
+
+# One timed stage. Usable as a context manager, or with start()/finish() around code
+# with many exits.
+class Span:
+    __slots__ = ('recorder', 'stage', 'attrs', 'started_at', '_start')
+    
+    def __init__(self, recorder, stage, attrs):
+        self.recorder = recorder
+        self.stage = stage
+        self.attrs = attrs
+        self.started_at = None
+        self._start = None
+    
+    def start(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+    
+    def finish(self, error=None):
+        if self._start is None:
+            return
+        duration = time.perf_counter() - self._start
+        self._start = None
+        if error is not None:
+            self.attrs['error'] = error
+        self.recorder.add(self.stage, self.started_at, duration, self.attrs)
+    
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+    
+    # Function to attach the HTTP status, body size and retry count of a response.
+    # Streamed bodies aren't read here; pass size once they have been written out.
+    def record_response(self, response, size=None):
+        self.attrs['status'] = response.status_code
+        
+        if size is None:
+            content = getattr(response, '_content', False)
+            if isinstance(content, bytes):
+                size = len(content)
+            elif response.headers.get('Content-Length', '').isdigit():
+                size = int(response.headers['Content-Length'])
+        if size is not None:
+            self.attrs['bytes'] = size
+        
+        retries = getattr(response, 'retry_count', 0)
+        if retries:
+            self.attrs['retries'] = retries
+        if getattr(response, 'from_cache', False):
+            self.attrs['cached'] = True
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish(exc_type.__name__ if exc_type is not None else None)
+
+class _NullSpan:
+    __slots__ = ()
+    
+    def start(self):
+        return self
+    
+    def finish(self, error=None):
+        pass
+    
+    def set(self, **attrs):
+        pass
+    
+    def record_response(self, response, size=None):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+# Collects finished spans from any thread.
+# Each stage keeps running totals and a fixed-bucket latency histogram, which is what the
+# Prometheus export and the summary table are built from, so memory use and the cost of a
+# summary don't grow with the number of spans; only the most recent raw spans are kept,
+# for the JSON lines export.
+class SpanRecorder:
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_spans=DEFAULT_MAX_SPANS):
+        self.buckets = tuple(sorted(buckets))
+        self.spans = deque(maxlen=max_spans)
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    def add(self, stage, started_at, duration, attrs):
+        record = {'stage': stage, 'start': started_at, 'seconds': duration, 'thread': threading.current_thread().name}
+        record.update(attrs)
+        
+        with self._lock:
+            self.spans.append(record)
+            
+            totals = self._stages.get(stage)
+            if totals is None:
+                totals = {
+                    'count': 0, 'seconds': 0.0, 'max': 0.0, 'bytes': 0, 'retries': 0, 'errors': 0,
+                    'statuses': Counter(), 'buckets': [0] * (len(self.buckets) + 1),
+                }
+                self._stages[stage] = totals
+            
+            totals['count'] += 1
+            totals['seconds'] += duration
+            totals['max'] = max(totals['max'], duration)
+            totals['bytes'] += attrs.get('bytes', 0)
+            totals['retries'] += attrs.get('retries', 0)
+            if 'error' in attrs:
+                totals['errors'] += 1
+            if 'status' in attrs:
+                totals['statuses'][attrs['status']] += 1
+            totals['buckets'][bisect.bisect_left(self.buckets, duration)] += 1
+    
+    def stages(self):
+        with self._lock:
+            return sorted(self._stages)
+    
+    # Function to summarise each stage as one row: count, total and percentile latencies,
+    # bytes, retries and errors. Percentiles are estimated from the histogram buckets.
+    def summary(self):
+        rows = []
+        with self._lock:
+            for stage in sorted(self._stages):
+                totals = self._stages[stage]
+                rows.append({
+                    'stage': stage,
+                    'count': totals['count'],
+                    'total_s': round(totals['seconds'], 3),
+                    'mean_ms': round(totals['seconds'] / totals['count'] * 1000, 1),
+                    'p50_ms': round(self._percentile(totals, 50) * 1000, 1),
+                    'p95_ms': round(self._percentile(totals, 95) * 1000, 1),
+                    'max_ms': round(totals['max'] * 1000, 1),
+                    'bytes': totals['bytes'],
+                    'retries': totals['retries'],
+                    'errors': totals['errors'],
+                })
+        return rows
+    
+    # Function to estimate a stage's latency percentile from its histogram, interpolating
+    # within the bucket it falls in; the open-ended last bucket ends at the slowest span
+    def _percentile(self, totals, pct):
+        rank = totals['count'] * pct / 100
+        seen, lower = 0, 0.0
+        for bound, count in zip(self.buckets + (totals['max'],), totals['buckets']):
+            if count and seen + count >= rank:
+                upper = min(bound, totals['max'])
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return totals['max']
+    
+    # Function to get a stage's latency histogram as (upper bound in seconds, count) pairs;
+    # the last bound is infinity
+    def histogram(self, stage):
+        with self._lock:
+            counts = list(self._stages[stage]['buckets']) if stage in self._stages else [0] * (len(self.buckets) + 1)
+        return list(zip(self.buckets + (float('inf'),), counts))
+    
+    def to_jsonl(self):
+        with self._lock:
+            spans = list(self.spans)
+        return "".join(json.dumps(record) + "\n" for record in spans)
+    
+    # Function to render the aggregates in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Wall time spent in each downloader stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = {stage: dict(totals, statuses=Counter(totals['statuses']), buckets=list(totals['buckets']))
+                      for stage, totals in self._stages.items()}
+        
+        for stage in sorted(stages):
+            totals = stages[stage]
+            label = _label_value(stage)
+            cumulative = 0
+            for bound, count in zip(self.buckets, totals['buckets']):
+                cumulative += count
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{label}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {totals["count"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{label}"}} {totals["seconds"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{label}"}} {totals["count"]}')
+        
+        for name, key, description in [
+            ('stage_bytes_total', 'bytes', "Bytes transferred in each stage."),
+            ('stage_retries_total', 'retries', "HTTP retries made in each stage."),
+            ('stage_errors_total', 'errors', "Stages that ended with an exception."),
+        ]:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for stage in sorted(stages):
+                lines.append(f'{METRIC_PREFIX}_{name}{{stage="{_label_value(stage)}"}} {stages[stage][key]}')
+        
+        lines.append(f"# HELP {METRIC_PREFIX}_http_responses_total HTTP responses by stage and status code.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_http_responses_total counter")
+        for stage in sorted(stages):
+            for status, count in sorted(stages[stage]['statuses'].items()):
+                lines.append(f'{METRIC_PREFIX}_http_responses_total{{stage="{_label_value(stage)}",status="{status}"}} {count}')
+        
+        return "\n".join(lines) + "\n"
+    
+    # Function to save the spans to a file: Prometheus text for .prom/.txt, JSON lines otherwise
+    def write(self, path):
+        text = self.to_prometheus() if os.path.splitext(path)[1].lower() in ('.prom', '.txt') else self.to_jsonl()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,55 @@
+import time
+import threading
+from collections import deque, Counter
+
+# Events kept for the log view; older ones are dropped, the per-level counts are not
+DEFAULT_LOG_LIMIT = 5000
+
+# Collects a run's report() events and fetch_amazon_orders' on_progress counts for a display
+# to poll. The display decides how often to redraw (the Streamlit app's job monitor polls once
+# a second), so it shows the same few elements however many orders there are, instead of
+# adding one per event.
+class ProgressTracker:
+    def __init__(self, total=None, log_limit=DEFAULT_LOG_LIMIT):
+        self.total = total
+        self.log = deque(maxlen=log_limit)
+        self.levels = Counter()
+        self.counts = {}
+        self.last_message = None
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    # Takes the place of the report(level, message) callback
+    def report(self, level, message):
+        with self._lock:
+            self.log.append({'time': time.strftime('%H:%M:%S'), 'level': level, 'message': message})
+            self.levels[level] += 1
+            self.last_message = (level, message)
+    
+    # Takes the place of fetch_amazon_orders' on_progress(counts) callback
+    def update(self, counts):
+        self.counts = counts
+    
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+    
+    # Orders completed per second so far
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.counts.get('completed', 0) / elapsed if elapsed > 0 else 0.0
+    
+    # Function to estimate how far along the run is, between 0 and 1. Without a known total
+    # this is measured against the orders queued so far, as the history is read page by page.
+    def fraction(self):
+        total = self.total or self.counts.get('queued', 0)
+        if not total:
+            return 0.0
+        return min(1.0, self.counts.get('completed', 0) / total)
+    
+    # Function to get the logged events, optionally of some levels only, oldest first
+    def entries(self, levels=None):
+        with self._lock:
+            entries = list(self.log)
+        if levels is not None:
+            entries = [entry for entry in entries if entry['level'] in levels]
+        return entries
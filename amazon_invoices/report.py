@@ -0,0 +1,17 @@
+import logging
+
+logger = logging.getLogger("amazon_invoices")
+
+LOG_LEVELS = {
+    'info': logging.INFO,
+    'success': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# Progress is reported through a callback taking (level, message), where level is one of
+# 'info', 'success', 'warning' or 'error'. The Streamlit app passes a ProgressTracker's, which
+# it polls to draw one status panel; everything else falls back to this one, which goes to
+# the standard logging module.
+def log_report(level, message):
+    logger.log(LOG_LEVELS.get(level, logging.INFO), message)
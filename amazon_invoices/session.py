@@ -0,0 +1,177 @@
+import time
+import threading
+import email.utils
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from amazon_invoices.http_cache import cached_response
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# (connect, read) timeout applied to every request that doesn't set its own
+DEFAULT_TIMEOUT = (10, 30)
+DEFAULT_RETRIES = 4
+
+# Seconds a primed response waits for its GET before it is dropped as stale
+PRIME_TTL = 30.0
+
+# Status codes worth retrying; Amazon answers throttled requests with 503 (and sometimes 429)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD')
+
+# Longest wait before a retry, in seconds, whatever the backoff or a Retry-After header asks for
+MAX_RETRY_WAIT = 60.0
+
+# Thread-safe token bucket: allows `rate` requests per second on average, with bursts of up to `capacity`.
+# Callers that find the bucket empty reserve a future token and sleep until it is due,
+# so waiting workers are served in arrival order.
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        
+        if wait:
+            time.sleep(wait)
+
+# Function to tell how long to wait before retry number `attempt` (from 0): exponential
+# backoff, or what the response's Retry-After header asks for, capped at MAX_RETRY_WAIT
+def retry_wait(attempt, response=None, backoff_factor=0.5):
+    wait = backoff_factor * (2 ** attempt)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                wait = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    return min(max(0.0, wait), MAX_RETRY_WAIT)
+
+# Session with pooled keep-alive connections, retries, default timeouts, a per-host
+# cap on requests in flight and an optional requests-per-second limit shared by every
+# thread using it. GETs and HEADs are retried here rather than inside the connection
+# adapter, so every attempt waits for the rate limit like a new request would. GETs can be served from an on-disk ResponseCache; pass cache=False to a
+# GET that must reach Amazon, such as a login check.
+class ThrottledSession(requests.Session):
+    def __init__(self, max_per_host=None, pool_size=10, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_RETRIES, requests_per_second=None, cache=None):
+        super().__init__()
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+        self.cache = cache
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+        self._primed = {}
+        self._primed_lock = threading.Lock()
+        
+        # Size the connection pool to the number of workers so concurrent requests
+        # reuse keep-alive connections instead of opening and discarding new ones
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+    
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = slot
+        return slot
+    
+    # Function to hand an already-downloaded response to the next GET of the same URL (once),
+    # if that GET comes within PRIME_TTL seconds
+    def prime(self, url, response):
+        with self._primed_lock:
+            self._primed[url] = (response, time.monotonic() + PRIME_TTL)
+    
+    def request(self, method, url, *args, cache=True, **kwargs):
+        if method.upper() == 'GET' and cache:
+            with self._primed_lock:
+                primed = self._primed.pop(url, None)
+                # Anything else primed and never asked for would only be served stale later
+                now = time.monotonic()
+                for stale in [key for key, (_, expires_at) in self._primed.items() if expires_at <= now]:
+                    del self._primed[stale]
+            if primed is not None and primed[1] > time.monotonic():
+                return primed[0]
+            
+            # Streamed downloads, non-following probes and parameterised requests go straight to the network
+            if (self.cache is not None and not args and not kwargs.get('stream') and
+                    kwargs.get('allow_redirects', True) and not kwargs.get('params')):
+                return self._cached_get(url, **kwargs)
+        
+        return self._send(method, url, *args, **kwargs)
+    
+    def _cached_get(self, url, **kwargs):
+        hit = self.cache.get(url)
+        if hit is not None and hit[0]['fresh']:
+            return cached_response(*hit)
+        
+        # Revalidate stale entries so unchanged pages cost a 304 instead of a full download
+        headers = dict(kwargs.pop('headers', None) or {})
+        if hit is not None:
+            cached_headers = hit[0]['headers']
+            if 'ETag' in cached_headers:
+                headers['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                headers['If-Modified-Since'] = cached_headers['Last-Modified']
+        
+        response = self._send('GET', url, headers=headers, **kwargs)
+        
+        if hit is not None and response.status_code == 304:
+            self.cache.refresh(url)
+            return cached_response(*hit, request=response.request)
+        
+        # Never cache a bounce to the sign-in page, or an expired session would look valid
+        if response.status_code == 200 and 'signin' not in response.url:
+            self.cache.put(url, response)
+        
+        return response
+    
+    # Function to send a request, retrying connection errors, timeouts and throttling responses
+    # of GETs and HEADs with backoff. The last response is returned even if it failed, with
+    # the number of retries it took as response.retry_count.
+    def _send(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.max_retries if method.upper() in RETRY_METHODS else 0
+        
+        for attempt in range(retries + 1):
+            try:
+                response = self._send_once(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+                response = None
+            else:
+                if attempt == retries or response.status_code not in RETRY_STATUSES:
+                    response.retry_count = attempt
+                    return response
+                response.close()
+            
+            time.sleep(retry_wait(attempt, response))
+    
+    def _send_once(self, method, url, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        
+        if not self.max_per_host:
+            return super().request(method, url, *args, **kwargs)
+        
+        with self._host_slot(url):
+            return super().request(method, url, *args, **kwargs)
@@ -1,20 +1,17 @@
+import io
 import os
+import glob
 import time
+import zipfile
+import datetime
 import streamlit as st
+import pandas as pd
 import tempfile
-import json
-import subprocess
-import sys
-import platform
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import requests
-from bs4 import BeautifulSoup
-import re
+from amazon_invoices import cookie_cache, dataset, jobs, profiling
+from amazon_invoices.checkpoint import list_checkpoints
+from amazon_invoices.blobstore import BlobStore, BLOBS_DIRNAME
+from amazon_invoices.orders import date_range_error
+from amazon_invoices.pipeline import DEFAULT_ORDERS_URL, DEFAULT_DOWNLOAD_DIR
 
 st.set_page_config(page_title="Amazon Invoice Downloader", page_icon="📦")
 
@@ -25,6 +22,20 @@ st.write("This app logs in to Amazon, captures your cookies, and downloads invoi
 temp_dir = tempfile.mkdtemp()
 st.sidebar.info(f"Temporary directory: {temp_dir}")
 
+# Order-history time periods, mapped to Amazon's filter values
+current_year = time.localtime().tm_year
+TIME_FILTERS = {"All orders": None, "Last 30 days": "last30", "Past 3 months": "months-3"}
+TIME_FILTERS.update({str(year): f"year-{year}" for year in range(current_year, current_year - 10, -1)})
+
+# Chosen in the time period list to pick exact dates instead, e.g. a quarter or a tax year
+DATE_RANGE = "Date range..."
+
+# Function to get the first and last day of the quarter before today's
+def previous_quarter():
+    first_of_quarter = datetime.date(current_year, 3 * ((time.localtime().tm_mon - 1) // 3) + 1, 1)
+    last = first_of_quarter - datetime.timedelta(days=1)
+    return datetime.date(last.year, last.month - 2, 1), last
+
 # User inputs
 with st.expander("📝 Amazon Login Information", expanded=True):
     email = st.text_input("📧 Amazon Email:", type="default")
@@ -34,13 +45,64 @@ with st.expander("📝 Amazon Login Information", expanded=True):
     if 'needs_2fa' in st.session_state and st.session_state.needs_2fa:
         verification_code = st.text_input("🔐 Enter verification code sent to your device:")
     
-    st.info("Your login information is only used locally to authenticate with Amazon. Nothing is stored or sent elsewhere.")
+    remember_session = st.checkbox(
+        "💾 Remember my Amazon session on this computer",
+        value=cookie_cache.is_available(),
+        disabled=not cookie_cache.is_available(),
+        help="Caches the session cookies, encrypted with your password, so later runs can skip the browser login."
+    )
+    
+    use_browser_pool = st.checkbox(
+        "🔥 Keep a warm browser ready for logins",
+        value=False,
+        help="Starts headless Chrome in the background and reuses it for later logins and 2FA retries."
+    )
+    
+    st.info("Your login information is only used locally to authenticate with Amazon. Nothing is sent elsewhere; "
+            "if you choose to remember your session, its cookies are stored encrypted on this computer only.")
 
 with st.expander("📁 Download Settings", expanded=True):
     orders_url = st.text_input("🔗 Amazon Orders URL:", 
-                              value="https://www.amazon.com/gp/your-account/order-history")
+                              value=DEFAULT_ORDERS_URL)
     download_dir = st.text_input("📁 Directory to save invoices:", 
-                                value=os.path.join(os.path.expanduser("~"), "amazon_invoices"))
+                                value=DEFAULT_DOWNLOAD_DIR)
+    time_filter_label = st.selectbox("🗓️ Time period:", list(TIME_FILTERS.keys()) + [DATE_RANGE])
+    date_range = ()
+    if time_filter_label == DATE_RANGE:
+        date_range = st.date_input("📆 Orders placed between:", value=previous_quarter(), max_value=datetime.date.today(),
+                                   help="Only the years in this range are read, and paging stops at the first older order.")
+    date_range_problem = date_range_error(date_range[0], date_range[1] if len(date_range) > 1 else None) if date_range else None
+    max_orders = st.number_input("🔢 Maximum orders to process (0 = all):", min_value=0, value=0)
+    skip_synced = st.checkbox("⏭️ Skip invoices that were already downloaded", value=True)
+    stop_at_synced = st.checkbox("🛑 Stop at the first already-downloaded order (incremental sync)", value=False)
+    render_pdfs = st.checkbox("🖨️ Convert HTML order summaries to PDF automatically", value=True)
+    render_workers = st.number_input("🖥️ PDF renderers (headless Chrome instances):", min_value=1, max_value=16,
+                                     value=min(4, os.cpu_count() or 1), disabled=not render_pdfs)
+    max_workers = st.number_input("⚡ Orders to download in parallel:", min_value=1, max_value=16, value=4)
+    max_per_host = st.number_input("🌐 Max simultaneous connections per host:", min_value=1, max_value=16, value=4)
+    use_http_cache = st.checkbox("🗄️ Cache order pages on disk between runs", value=True,
+                                 help="Order-details and invoice pages are only re-downloaded when they have changed.")
+    requests_per_second = st.number_input("🚦 Max requests per second (0 = unlimited):", min_value=0.0, value=5.0, step=1.0,
+                                          help="Shared by all parallel downloads, to stay below Amazon's throttling.")
+    extract_data = st.checkbox(
+        "📊 Record order dates, items and totals for spend reports",
+        value=dataset.is_available(),
+        disabled=not dataset.is_available(),
+        help="Saved as a Parquet dataset in the download directory (needs pyarrow)."
+    )
+    store_blobs = st.checkbox("🗜️ Store documents deduplicated and compressed", value=False,
+                              help="Identical invoices are kept once and HTML summaries compressed, in the download "
+                                   "directory's document store. Export them as a ZIP below.")
+    memory_budget_mb = st.number_input("🧠 Memory budget in MB (0 = none):", min_value=0, value=0, step=256,
+                                       help="Above it, orders are downloaded one at a time until memory use drops.")
+    record_timings = st.checkbox("⏱️ Record per-stage timings", value=False,
+                                 help="Times the login, page fetches, parsing and PDF writes; results appear in the sidebar.")
+
+# Warm browsers are shared across reruns and sessions of this app
+@st.cache_resource
+def get_browser_pool(size):
+    from amazon_invoices.browser import BrowserPool
+    return BrowserPool(size=size)
 
 # Ensure download directory exists
 if download_dir and not os.path.exists(download_dir):
@@ -52,430 +114,261 @@ if download_dir and not os.path.exists(download_dir):
         download_dir = temp_dir
         st.info(f"Using temporary directory instead: {download_dir}")
 
-# Function to extract cookies using Selenium
-def extract_amazon_cookies(email, password, verification_code=None):
-    st.info("🚀 Launching browser to extract cookies...")
-    
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--window-size=1920x1080")
-    options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    # Try to avoid detection
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
-    
-    try:
-        service = Service()
-        driver = webdriver.Chrome(service=service, options=options)
-        
-        # Navigate to Amazon login
-        driver.get("https://www.amazon.com/ap/signin?openid.pape.max_auth_age=0&openid.return_to=https%3A%2F%2Fwww.amazon.com%2F%3Fref_%3Dnav_signin&openid.identity=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0%2Fidentifier_select&openid.assoc_handle=usflex&openid.mode=checkid_setup&openid.claimed_id=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0%2Fidentifier_select&openid.ns=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0")
-        
-        # Handle email
-        try:
-            email_field = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "ap_email"))
-            )
-            email_field.send_keys(email)
-            
-            continue_button = driver.find_element(By.ID, "continue")
-            continue_button.click()
-        except Exception as e:
-            st.error(f"Error entering email: {e}")
-            driver.quit()
-            return None, f"Error entering email: {e}"
-        
-        # Handle password
-        try:
-            password_field = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "ap_password"))
-            )
-            password_field.send_keys(password)
-            
-            signin_button = driver.find_element(By.ID, "signInSubmit")
-            signin_button.click()
-        except Exception as e:
-            st.error(f"Error entering password: {e}")
-            driver.quit()
-            return None, f"Error entering password: {e}"
-        
-        # Check if 2FA is needed
-        time.sleep(3)  # Allow page to load
-        
-        page_source = driver.page_source.lower()
-        if verification_code and ('verification' in page_source or 'two-factor' in page_source or 'otp' in page_source):
-            try:
-                # Find verification code input field - try different possible IDs and types
-                verif_field = None
-                
-                # Try different possible field identifiers
-                for field_id in ['auth-mfa-otpcode', 'ap_verification_code', 'auth-mfa-code', 'cvf-input-code']:
-                    try:
-                        verif_field = driver.find_element(By.ID, field_id)
-                        break
-                    except:
-                        pass
-                
-                # If not found by ID, try by attribute
-                if not verif_field:
-                    try:
-                        verif_field = driver.find_element(By.CSS_SELECTOR, "input[name='otpCode'], input[name='code'], input[name='cvf_verification_code']")
-                    except:
-                        pass
-                
-                # If still not found, try by input type
-                if not verif_field:
-                    try:
-                        verif_field = driver.find_element(By.CSS_SELECTOR, "input[type='number'], input[type='tel']")
-                    except:
-                        pass
-                
-                if not verif_field:
-                    return None, "2FA required but couldn't find verification code input field"
-                
-                # Enter verification code
-                verif_field.send_keys(verification_code)
-                
-                # Find submit button
-                submit_button = None
-                
-                # Try different ways to find the submit button
-                for button_id in ['auth-verify-button', 'auth-signin-button', 'cvf-submit-otp-button']:
-                    try:
-                        submit_button = driver.find_element(By.ID, button_id)
-                        break
-                    except:
-                        pass
-                
-                if not submit_button:
-                    try:
-                        # Try to find by type and value
-                        submit_button = driver.find_element(By.CSS_SELECTOR, "input[type='submit'], button[type='submit']")
-                    except:
-                        pass
-                
-                if not submit_button:
-                    # Try to find by text content
-                    for text in ['submit', 'verify', 'continue']:
-                        try:
-                            submit_button = driver.find_element(By.XPATH, f"//button[contains(text(), '{text}')]")
-                            break
-                        except:
-                            pass
-                
-                if not submit_button:
-                    return None, "2FA required but couldn't find submit button"
-                
-                # Click submit
-                submit_button.click()
-                time.sleep(5)  # Allow for verification
-                
-            except Exception as e:
-                st.error(f"Error handling 2FA: {e}")
-                driver.quit()
-                return None, f"Error handling 2FA: {e}"
-        
-        elif not verification_code and ('verification' in page_source or 'two-factor' in page_source or 'otp' in page_source):
-            # Need 2FA but no code provided
-            st.session_state.needs_2fa = True
-            driver.quit()
-            return None, "2FA_REQUIRED"
-        
-        # Check if login was successful
-        time.sleep(5)  # Allow page to fully load
-        current_url = driver.current_url
-        
-        if "signin" in current_url or "ap/signin" in current_url:
-            # Still on login page, authentication failed
-            driver.quit()
-            return None, "Login failed. Check your credentials."
-        
-        # Extract cookies
-        cookies = driver.get_cookies()
-        
-        # Convert to format usable by requests
-        cookies_dict = {cookie['name']: cookie['value'] for cookie in cookies}
-        
-        # Save screenshot for debugging
-        driver.save_screenshot(os.path.join(temp_dir, "amazon_logged_in.png"))
-        
-        driver.quit()
-        return cookies_dict, "Cookies extracted successfully"
-        
-    except Exception as e:
-        st.error(f"Error extracting cookies: {e}")
-        if 'driver' in locals():
-            driver.quit()
-        return None, f"Error extracting cookies: {e}"
+# Rows per page of the order log
+LOG_PAGE_SIZE = 50
+
+LOG_LEVEL_ICONS = {'info': "ℹ️", 'success': "✅", 'warning': "⚠️", 'error': "❌"}
+
+# Unfinished downloads offered for resuming, newest first
+MAX_RESUMABLE_SHOWN = 5
+
+# Function to draw a job's progress: one bar, four counters and the latest message. It is
+# redrawn from the job's tracker on every poll, so a run of any size only ever shows these few.
+def draw_progress(tracker, latest=True):
+    counts = tracker.counts
+    if counts:
+        st.progress(tracker.fraction(), text=f"{counts['completed']} of {counts['queued']} orders "
+                                             f"({tracker.rate():.1f}/s, {tracker.elapsed():.0f} s)")
+    else:
+        st.progress(0.0, text="Signing in...")
+    for column, (label, value) in zip(st.columns(4), [
+        ("Orders found", counts.get('found', 0)),
+        ("Downloaded", counts.get('downloaded', 0) + counts.get('rendered', 0)),
+        ("Already synced", counts.get('already_synced', 0)),
+        ("Errors", tracker.levels['error']),
+    ]):
+        column.metric(label, value)
+    if latest and tracker.last_message is not None:
+        level, message = tracker.last_message
+        getattr(st, level)(message)
+
+# Status block label and state for each job status
+JOB_STATUS_LABELS = {
+    'running': ("🔄 Logging in to Amazon and downloading invoices...", "running"),
+    'done': ("✅ Download finished", "complete"),
+    'stopped': ("⏸️ Download stopped; it can be resumed", "error"),
+    'needs_2fa': ("🔐 Waiting for a verification code", "error"),
+    'failed': ("❌ Download failed; it can be resumed", "error"),
+}
 
-# Function to create a session with the provided cookies
-def create_session_with_cookies(cookies_dict):
-    session = requests.Session()
+# Function to find the HTML summaries saved since the given time, for one download button.
+# Returns their count and a function that zips them, so the archive is only built when the
+# button is clicked rather than on every rerun of the page.
+def zip_html_summaries(directory, since):
+    paths = [path for path in glob.glob(os.path.join(directory, "Amazon_Order_*.html")) if os.path.getmtime(path) >= since]
+    if not paths:
+        return None
     
-    # Update headers to mimic a browser
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    })
+    def build():
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path in sorted(paths):
+                archive.write(path, os.path.basename(path))
+        return buffer.getvalue()
+    return len(paths), build
+
+# Downloads run as background jobs (amazon_invoices.jobs) that outlive reruns of this script.
+# While one runs, only this fragment reruns, once a second, to poll it; the whole page is
+# rerun when the job ends so its results are shown.
+@st.fragment(run_every=1.0)
+def job_monitor(job_id):
+    job = jobs.get_job(job_id)
+    if job is None or not job.running:
+        st.session_state.job_just_finished = True
+        st.rerun()
     
-    # Set cookies
-    for name, value in cookies_dict.items():
-        session.cookies.set(name, value, domain='.amazon.com')
+    label, state = JOB_STATUS_LABELS['running']
+    with st.status(label, state=state, expanded=True):
+        draw_progress(job.tracker)
+        st.button("⏸️ Stop after the orders in progress", on_click=job.stop, disabled=job.stop_event.is_set())
     
-    return session
+    # The sidebar can't be drawn from a fragment, so live timings go under the status block
+    if job.recorder is not None:
+        with st.expander("⏱️ Stage timings so far", expanded=False):
+            st.dataframe(job.recorder.summary(), hide_index=True)
 
-# Function to verify login status
-def verify_amazon_login(session, test_url):
-    try:
-        response = session.get(test_url)
-        
-        # Check if redirected to sign-in page
-        if 'signin' in response.url or 'ap/signin' in response.url:
-            return False, "Not logged in. Amazon is requesting authentication."
-        
-        # Check for indicators of being logged in
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Look for account/profile elements that indicate logged-in state
-        account_list = soup.find(id='nav-link-accountList') or soup.find(id='nav-tools')
-        
-        if account_list and ('account' in response.text.lower() or 'hello' in response.text.lower()):
-            # Try to find user name
-            name_element = soup.select_one('#nav-link-accountList-nav-line-1, .nav-line-1')
-            username = name_element.text.strip() if name_element else "User"
-            
-            return True, f"Successfully authenticated as {username}!"
-        
-        return False, "Login verification failed. Cookies may be expired."
-    
-    except Exception as e:
-        return False, f"Error verifying login: {e}"
+# Function to start (or, given a checkpoint, resume) a download job with the settings above
+def start_download(checkpoint=None, verification_code=None):
+    job = jobs.start_job(
+        checkpoint.email if checkpoint is not None and checkpoint.email else email, password,
+        download_dir=download_dir,
+        checkpoint=checkpoint,
+        verification_code=verification_code,
+        recorder=profiling.SpanRecorder() if record_timings else None,
+        browser_pool=get_browser_pool(1) if use_browser_pool else None,
+        screenshot_dir=temp_dir,
+        options={
+            'orders_url': orders_url,
+            'remember_session': remember_session,
+            'use_http_cache': use_http_cache,
+            'max_per_host': int(max_per_host),
+            'max_workers': int(max_workers),
+            'requests_per_second': requests_per_second,
+            'max_orders': int(max_orders) or None,
+            'time_filter': TIME_FILTERS.get(time_filter_label),
+            'since': date_range[0] if date_range else None,
+            'until': date_range[1] if len(date_range) > 1 else None,
+            'skip_synced': skip_synced,
+            'stop_at_synced': skip_synced and stop_at_synced,
+            'render_pdfs': render_pdfs,
+            'render_workers': int(render_workers),
+            'extract_data': extract_data,
+            'storage': 'blobs' if store_blobs else 'files',
+            'memory_budget_mb': int(memory_budget_mb) or None,
+        }
+    )
+    st.session_state.job_id = job.job_id
 
-# Function to fetch and process orders
-def fetch_amazon_orders(session, orders_url, download_dir, max_orders=5):
-    try:
-        response = session.get(orders_url)
-        
-        if response.status_code != 200:
-            return False, f"Failed to load orders page. Status code: {response.status_code}"
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Try different selectors for order containers
-        order_containers = soup.select('.order') or soup.select('.js-order-card') or soup.select('.order-card')
-        
-        if not order_containers:
-            return False, "Could not find any orders on the page. Amazon may have changed their page layout."
-        
-        orders_processed = 0
-        successful_downloads = 0
-        
-        for i, container in enumerate(order_containers):
-            if i >= max_orders:
-                break
-                
-            try:
-                # Extract order ID
-                order_id_elem = container.select_one('.order-info .value, .order-id, .yo-orderid, [data-test-id="order-id-container"]')
-                order_id = order_id_elem.text.strip() if order_id_elem else f"Order-{i+1}"
-                
-                # Clean up order ID (remove extra text)
-                order_id = re.sub(r'Order #', '', order_id).strip()
-                order_id = re.sub(r'\s+', '-', order_id)
-                
-                st.info(f"🔍 Processing order: {order_id}")
-                
-                # Find invoice link
-                invoice_link = None
-                invoice_links = []
-                
-                # Try different selectors and approaches
-                for link in container.select('a'):
-                    href = link.get('href', '')
-                    text = link.text.lower()
-                    
-                    if ('invoice' in text or 'invoice' in href.lower() or 
-                        'receipt' in text or 'receipt' in href.lower()):
-                        full_url = 'https://www.amazon.com' + href if not href.startswith('http') else href
-                        invoice_links.append(full_url)
-                
-                if not invoice_links:
-                    # Try to find "Order Details" link
-                    for link in container.select('a'):
-                        href = link.get('href', '')
-                        text = link.text.lower()
-                        
-                        if ('order details' in text or 'details' in text or 
-                            'view order' in text or 'order-details' in href):
-                            order_details_url = 'https://www.amazon.com' + href if not href.startswith('http') else href
-                            
-                            # Visit order details page to find invoice link
-                            details_response = session.get(order_details_url)
-                            details_soup = BeautifulSoup(details_response.text, 'html.parser')
-                            
-                            for details_link in details_soup.select('a'):
-                                details_href = details_link.get('href', '')
-                                details_text = details_link.text.lower()
-                                
-                                if ('invoice' in details_text or 'invoice' in details_href.lower() or
-                                    'receipt' in details_text or 'receipt' in details_href.lower()):
-                                    full_url = 'https://www.amazon.com' + details_href if not details_href.startswith('http') else details_href
-                                    invoice_links.append(full_url)
-                            
-                            break
-                
-                if not invoice_links:
-                    st.warning(f"⚠️ No invoice link found for order {order_id}. Skipping.")
-                    continue
-                
-                # Visit the first invoice link
-                invoice_link = invoice_links[0]
-                st.info(f"📄 Found invoice link for order {order_id}")
-                
-                invoice_response = session.get(invoice_link)
-                invoice_soup = BeautifulSoup(invoice_response.text, 'html.parser')
-                
-                # Look for printable order summary link
-                printable_link = None
-                
-                # Method 1: Direct link in a popover
-                popover_links = invoice_soup.select('.a-popover-content a, [data-action="a-popover"] a')
-                for link in popover_links:
-                    link_text = link.text.lower()
-                    if 'print' in link_text or 'summary' in link_text or 'invoice' in link_text:
-                        printable_link = link.get('href')
-                        break
-                
-                # Method 2: From "Print Order Summary" button
-                if not printable_link:
-                    print_buttons = invoice_soup.select('input[type="submit"][value*="Print"], button:contains("Print")')
-                    if print_buttons:
-                        # This might be a form submission, extract form action
-                        parent_form = print_buttons[0].find_parent('form')
-                        if parent_form:
-                            printable_link = parent_form.get('action')
-                
-                # Method 3: Directly from page links
-                if not printable_link:
-                    for link in invoice_soup.select('a'):
-                        href = link.get('href', '')
-                        text = link.text.lower()
-                        if ('print' in text and ('summary' in text or 'invoice' in text)) or 'print-summary' in href:
-                            printable_link = href
-                            break
-                
-                if not printable_link:
-                    st.warning(f"⚠️ No printable summary link found for order {order_id}. Skipping.")
-                    continue
-                
-                # Make printable link absolute
-                printable_link = 'https://www.amazon.com' + printable_link if not printable_link.startswith('http') else printable_link
-                
-                # Download the printable order summary
-                st.info(f"📥 Downloading invoice for order {order_id}")
-                
-                summary_response = session.get(printable_link)
-                
-                # Check if it's a PDF or HTML
-                content_type = summary_response.headers.get('Content-Type', '').lower()
-                
-                filename = f"Amazon_Invoice_{order_id}.pdf"
-                filepath = os.path.join(download_dir, filename)
-                
-                if 'pdf' in content_type:
-                    # Direct PDF download
-                    with open(filepath, 'wb') as f:
-                        f.write(summary_response.content)
-                else:
-                    # It's HTML that should be printed to PDF
-                    # Save the HTML temporarily
-                    html_path = os.path.join(temp_dir, f"order_{order_id}.html")
-                    with open(html_path, 'w', encoding='utf-8') as f:
-                        f.write(summary_response.text)
-                    
-                    # Let the user know they need to print it manually
-                    st.info(f"📄 Saved HTML for order {order_id}. You'll need to open and print it to PDF manually.")
-                    
-                    # Provide the HTML content for download
-                    with open(html_path, 'r', encoding='utf-8') as f:
-                        html_content = f.read()
-                        
-                    st.download_button(
-                        label=f"Download HTML for Order {order_id}",
-                        data=html_content,
-                        file_name=f"Amazon_Order_{order_id}.html",
-                        mime="text/html"
-                    )
-                    
-                    continue
-                
-                st.success(f"✅ Successfully downloaded invoice for order {order_id}")
-                successful_downloads += 1
-                
-            except Exception as e:
-                st.error(f"❌ Error processing order {i+1}: {str(e)}")
-            
-            orders_processed += 1
-        
-        return True, f"Processed {orders_processed} orders with {successful_downloads} successful downloads."
-    
-    except Exception as e:
-        return False, f"Error fetching orders: {str(e)}"
+current_job = jobs.get_job(st.session_state.get('job_id'))
 
 # Main action button
-if st.button("Login & Download Invoices"):
+if st.button("Login & Download Invoices", disabled=current_job is not None and current_job.running):
     if not email or not password:
         st.error("❌ Please enter your Amazon email and password.")
+    elif date_range_problem:
+        st.error(f"❌ {date_range_problem}")
     elif 'needs_2fa' in st.session_state and st.session_state.needs_2fa and not 'verification_code' in locals():
         st.error("❌ Please enter the verification code sent to your device.")
     else:
         # Reset 2FA flag if already set
         verification_code_val = verification_code if 'verification_code' in locals() else None
         
-        # Extract cookies
-        with st.spinner("🔄 Logging in to Amazon and extracting cookies..."):
-            cookies_dict, message = extract_amazon_cookies(email, password, verification_code_val)
-            
-            if message == "2FA_REQUIRED":
-                st.warning("Amazon requires two-factor authentication. Please enter the verification code sent to your device.")
-                st.rerun()  # Rerun to show verification code input
-            elif not cookies_dict:
-                st.error(f"Failed to extract cookies: {message}")
-            else:
-                st.success("✅ Successfully extracted Amazon cookies!")
-                
-                # Verify login
-                with st.spinner("🔄 Verifying login status..."):
-                    session = create_session_with_cookies(cookies_dict)
-                    logged_in, login_message = verify_amazon_login(session, orders_url)
-                    
-                    if logged_in:
-                        st.success(login_message)
-                        
-                        # Fetch and download invoices
-                        with st.spinner("🔄 Fetching orders and downloading invoices..."):
-                            success, result_message = fetch_amazon_orders(session, orders_url, download_dir)
-                            
-                            if success:
-                                st.success(result_message)
-                                st.balloons()
-                            else:
-                                st.error(result_message)
-                    else:
-                        st.error(login_message)
+        # A job that stopped for a verification code carries on from where it was
+        waiting = current_job if current_job is not None and current_job.status == 'needs_2fa' else None
+        start_download(checkpoint=waiting.checkpoint if waiting else None, verification_code=verification_code_val)
+        current_job = jobs.get_job(st.session_state.job_id)
+
+if current_job is not None and current_job.running:
+    job_monitor(current_job.job_id)
+elif current_job is not None:
+    if current_job.recorder is not None:
+        st.session_state.stage_timings = current_job.recorder
+    
+    label, state = JOB_STATUS_LABELS.get(current_job.status, JOB_STATUS_LABELS['failed'])
+    with st.status(label, state=state, expanded=False):
+        draw_progress(current_job.tracker, latest=False)
+    
+    success, result_message = current_job.result or (False, current_job.checkpoint.message)
+    if current_job.status == 'needs_2fa':
+        if not st.session_state.get('needs_2fa'):
+            st.session_state.needs_2fa = True
+            st.rerun()  # Rerun to show verification code input
+        st.warning("Amazon requires two-factor authentication. Please enter the verification code sent to your device.")
+    elif current_job.status == 'stopped':
+        st.warning(result_message)
+    elif success:
+        st.success(result_message)
+        if st.session_state.pop('job_just_finished', False):
+            st.balloons()
+    else:
+        st.error(result_message)
+    
+    # Summaries Amazon only serves as HTML are saved next to the invoices; one archive replaces a button per order
+    summaries = zip_html_summaries(download_dir, current_job.started_at)
+    if summaries is not None:
+        count, archive = summaries
+        st.download_button(f"Download {count} HTML order summaries (ZIP)", archive,
+                           file_name="Amazon_Order_Summaries.zip", mime="application/zip")
+    
+    # Per-order detail of the run, a page at a time
+    run_log = current_job.tracker.entries()
+    with st.expander(f"📜 Order log ({len(run_log)} events)", expanded=False):
+        levels = st.multiselect("Show:", list(LOG_LEVEL_ICONS), default=list(LOG_LEVEL_ICONS),
+                                format_func=lambda level: f"{LOG_LEVEL_ICONS[level]} {level}")
+        entries = [entry for entry in run_log if entry['level'] in levels]
+        pages = max(1, -(-len(entries) // LOG_PAGE_SIZE))
+        page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1)
+        st.dataframe(entries[(page - 1) * LOG_PAGE_SIZE:page * LOG_PAGE_SIZE], hide_index=True)
+
+# Downloads into this folder that stopped part way or left orders to retry, in this session or
+# an earlier one (a checkpoint still marked running with no live job belongs to a server that went away)
+unfinished = [
+    saved for saved in (list_checkpoints(download_dir) if download_dir else [])
+    if not (jobs.get_job(saved.job_id) and jobs.get_job(saved.job_id).running)
+]
+if unfinished:
+    with st.expander(f"⏯️ Unfinished downloads ({len(unfinished)})", expanded=False):
+        for saved in unfinished[:MAX_RESUMABLE_SHOWN]:
+            cursor = saved.cursor or {}
+            st.markdown(f"**{time.strftime('%Y-%m-%d %H:%M', time.localtime(saved.created_at))}** · {saved.email or ''} · "
+                        f"{saved.status} · {cursor.get('position', 0)} orders in, {len(saved.retries)} to retry")
+            if saved.message:
+                st.caption(saved.message)
+            if st.button("▶️ Resume", key=f"resume-{saved.job_id}",
+                         disabled=not password or current_job is not None and current_job.running):
+                start_download(checkpoint=saved)
+                st.rerun()
+
+# Function to build a ZIP of stored documents, only once the export button is clicked.
+# It is streamed into a temporary file a blob at a time, so only the finished archive,
+# which Streamlit needs to serve, is ever held in memory.
+def export_archive(store, entries):
+    def build():
+        with tempfile.TemporaryFile() as archive:
+            store.write_zip(entries, archive)
+            archive.seek(0)
+            return archive.read()
+    return build
+
+# Documents kept in this directory's document store, exported for a range of order dates
+document_store = BlobStore(download_dir) if download_dir and os.path.isdir(os.path.join(download_dir, BLOBS_DIRNAME)) else None
+if document_store is not None and len(document_store):
+    with st.expander(f"🗜️ Export Stored Documents ({len(document_store)})", expanded=False):
+        export_range = st.date_input("📆 Orders placed between:", value=previous_quarter(), key="export_range")
+        export_entries = document_store.entries(since=export_range[0] if export_range else None,
+                                                until=export_range[1] if len(export_range) > 1 else None)
+        st.caption(f"{len(export_entries)} documents, {sum(entry['size'] for entry in export_entries) / 1024 / 1024:.1f} MB uncompressed")
+        st.download_button("Download ZIP", export_archive(document_store, export_entries),
+                           file_name="Amazon_Invoices.zip", mime="application/zip", disabled=not export_entries)
+
+# Spend reports over everything downloaded into this directory so far
+order_data = dataset.load_dataset(download_dir) if download_dir else None
+if order_data is not None and order_data.num_rows:
+    with st.expander(f"📊 Spend Reports ({order_data.num_rows} orders)", expanded=False):
+        by_month, by_category, by_tax_year = st.tabs(["By month", "By category", "By tax year"])
+        with by_month:
+            monthly = dataset.spend_by_month(order_data)
+            st.bar_chart(monthly, x='month', y='total')
+            st.dataframe(monthly, hide_index=True)
+        with by_category:
+            st.dataframe(dataset.spend_by_category(order_data), hide_index=True)
+            st.caption("Categories are guessed from item titles; Amazon invoices don't include them.")
+        with by_tax_year:
+            start_month = st.selectbox("Tax year starts in:", range(1, 13),
+                                       format_func=lambda month: time.strftime('%B', time.strptime(str(month), '%m')))
+            st.dataframe(dataset.spend_by_tax_year(order_data, start_month=start_month), hide_index=True)
+
+# Stage timings from the last run that recorded them
+if st.session_state.get('stage_timings') is not None:
+    recorder = st.session_state.stage_timings
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("⏱️ Stage Timings")
+    st.sidebar.dataframe(recorder.summary(), hide_index=True)
+    
+    stages = recorder.stages()
+    if stages:
+        stage = st.sidebar.selectbox("Latency histogram for:", stages)
+        counts = [count for _, count in recorder.histogram(stage)]
+        labels = [f"≤{bound * 1000:g} ms" if bound < 1 else f"≤{bound:g} s" for bound in recorder.buckets]
+        labels.append(f">{recorder.buckets[-1]:g} s")
+        
+        # An ordered category keeps the buckets in latency order rather than alphabetical
+        st.sidebar.bar_chart(
+            pd.DataFrame({'latency': pd.Categorical(labels, categories=labels, ordered=True), 'spans': counts}),
+            x='latency', y='spans'
+        )
+    
+    st.sidebar.download_button("Download spans (JSON lines)", recorder.to_jsonl(),
+                               file_name="amazon_invoices_spans.jsonl", mime="application/x-ndjson")
+    st.sidebar.download_button("Download metrics (Prometheus)", recorder.to_prometheus(),
+                               file_name="amazon_invoices_metrics.prom", mime="text/plain")
 
 # Add disclaimer
 st.sidebar.markdown("---")
 st.sidebar.info("""
 **Disclaimer:** This app uses your Amazon credentials to log in and extract your cookie data. 
-Your credentials are used only in this session and are not stored. Please use responsibly and in accordance 
+Your credentials are used only in this session and are not stored. If you choose to remember your session, 
+its cookies are cached locally, encrypted with your password. Please use responsibly and in accordance 
 with Amazon's Terms of Service.
 """)
 
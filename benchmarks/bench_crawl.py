@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_amazon import FakeAmazonServer
+
+# End-to-end benchmark of fetch_amazon_orders and verify_amazon_login against a local
+# fake Amazon. Each scenario runs in a fresh process so its peak RSS is its own, and the
+# results are written as JSON so two commits can be compared with --compare.
+
+# Function to read a percentile from already sorted samples (nearest rank)
+def percentile(samples, pct):
+    if not samples:
+        return None
+    rank = max(0, min(len(samples) - 1, math.ceil(pct / 100 * len(samples)) - 1))
+    return samples[rank]
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# Wraps a module-level function so every call's wall time is recorded (from any thread)
+class CallTimer:
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self.original = getattr(module, name)
+        self.samples = []
+        self._lock = threading.Lock()
+        setattr(module, name, self._timed)
+    
+    def _timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.original(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.samples.append(elapsed)
+    
+    def restore(self):
+        setattr(self.module, self.name, self.original)
+    
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            'calls': len(samples),
+            'total_ms': sum(samples) * 1000,
+            'p50_ms': percentile(samples, 50) * 1000 if samples else None,
+            'p99_ms': percentile(samples, 99) * 1000 if samples else None,
+        }
+
+def _latency_summary(samples):
+    samples = sorted(samples)
+    return {
+        'p50_ms': percentile(samples, 50) * 1000 if samples else None,
+        'p99_ms': percentile(samples, 99) * 1000 if samples else None,
+        'max_ms': samples[-1] * 1000 if samples else None,
+    }
+
+def bench_fetch(params):
+    from amazon_invoices import orders
+    from amazon_invoices.auth import create_session_with_cookies
+    
+    # Dates travel as ISO strings so the parameters stay JSON
+    since, until = [datetime.date.fromisoformat(params[key]) if params.get(key) else None for key in ('since', 'until')]
+    
+    runs = []
+    with FakeAmazonServer(orders=params['orders'], page_size=params['page_size'], latency=params['latency'],
+                          filler_kb=params['filler_kb'], summary=params['summary'], pdf_kb=params['pdf_kb']) as fake:
+        work_dir = tempfile.mkdtemp(prefix="bench_crawl_")
+        cache_dir = os.path.join(work_dir, "cache") if params['http_cache'] else None
+        try:
+            for run in range(params['repeat']):
+                session = create_session_with_cookies({'session-id': 'bench'}, max_per_host=params['max_per_host'],
+                                                      max_workers=params['workers'], cache_dir=cache_dir)
+                download_dir = os.path.join(work_dir, f"run{run}")
+                os.makedirs(download_dir)
+                
+                order_timer = CallTimer(orders, 'process_order')
+                parse_timer = CallTimer(orders, 'parse_html')
+                requests_before = sum(fake.requests.values())
+                try:
+                    start = time.perf_counter()
+                    success, message = orders.fetch_amazon_orders(
+                        session, fake.orders_url, download_dir,
+                        max_workers=params['workers'], render_pdfs=False, since=since, until=until,
+                        report=lambda level, message: None, on_html=lambda order_id, html: None
+                    )
+                    elapsed = time.perf_counter() - start
+                finally:
+                    order_timer.restore()
+                    parse_timer.restore()
+                    session.close()
+                
+                if not success:
+                    raise RuntimeError(message)
+                
+                runs.append({
+                    'seconds': elapsed,
+                    'orders': len(order_timer.samples),
+                    'orders_per_sec': len(order_timer.samples) / elapsed if elapsed else None,
+                    'requests': sum(fake.requests.values()) - requests_before,
+                    'order_latency': _latency_summary(order_timer.samples),
+                    'parse': parse_timer.summary(),
+                })
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    # The median run by wall time stands for the scenario; every run is kept for reference
+    best = sorted(runs, key=lambda run: run['seconds'])[len(runs) // 2]
+    return dict(best, runs=runs, peak_rss_kb=peak_rss_kb())
+
+def bench_verify(params):
+    from amazon_invoices import auth
+    
+    latencies = []
+    with FakeAmazonServer(orders=params['page_size'], page_size=params['page_size'], latency=params['latency'],
+                          filler_kb=params['filler_kb']) as fake:
+        session = auth.create_session_with_cookies({'session-id': 'bench'})
+        parse_timer = CallTimer(auth, 'parse_html')
+        try:
+            for _ in range(params['verify_repeat']):
+                start = time.perf_counter()
+                success, message = auth.verify_amazon_login(session, fake.orders_url)
+                latencies.append(time.perf_counter() - start)
+                if not success:
+                    raise RuntimeError(message)
+        finally:
+            parse_timer.restore()
+            session.close()
+    
+    return dict(_latency_summary(latencies), calls=len(latencies), parse=parse_timer.summary(), peak_rss_kb=peak_rss_kb())
+
+BENCHMARKS = {
+    'fetch_amazon_orders': bench_fetch,
+    'verify_amazon_login': bench_verify,
+}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_all(params, names):
+    results = {}
+    # One spawned process per benchmark, so peak RSS isn't inherited from an earlier one
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(BENCHMARKS[name], params).result()
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+
+# Function to format a timing that is None when nothing was measured (a run with no orders)
+def _ms(value, digits=1):
+    return f"{value:.{digits}f} ms" if value is not None else "n/a"
+
+def print_report(report):
+    fetch = report['results'].get('fetch_amazon_orders')
+    if fetch:
+        rate = f"{fetch['orders_per_sec']:.1f}" if fetch['orders_per_sec'] is not None else "n/a"
+        print(f"fetch_amazon_orders: {fetch['orders']} orders in {fetch['seconds']:.2f} s "
+              f"({rate} orders/s, {fetch['requests']} requests)")
+        print(f"  per-order latency p50 {_ms(fetch['order_latency']['p50_ms'])}, p99 {_ms(fetch['order_latency']['p99_ms'])}")
+        print(f"  parse_html {fetch['parse']['calls']} calls, {_ms(fetch['parse']['total_ms'])} total, "
+              f"p50 {_ms(fetch['parse']['p50_ms'], 2)}")
+        if fetch['peak_rss_kb']:
+            print(f"  peak RSS {fetch['peak_rss_kb'] / 1024:.1f} MiB")
+    
+    verify = report['results'].get('verify_amazon_login')
+    if verify:
+        print(f"verify_amazon_login: {verify['calls']} calls, p50 {_ms(verify['p50_ms'])}, p99 {_ms(verify['p99_ms'])}, "
+              f"parse p50 {_ms(verify['parse']['p50_ms'], 2)}")
+        if verify['peak_rss_kb']:
+            print(f"  peak RSS {verify['peak_rss_kb'] / 1024:.1f} MiB")
+
+# The headline numbers compared between two result files, and whether bigger is better
+COMPARED_METRICS = [
+    ('fetch_amazon_orders', ('orders_per_sec',), True),
+    ('fetch_amazon_orders', ('order_latency', 'p50_ms'), False),
+    ('fetch_amazon_orders', ('order_latency', 'p99_ms'), False),
+    ('fetch_amazon_orders', ('parse', 'total_ms'), False),
+    ('fetch_amazon_orders', ('peak_rss_kb',), False),
+    ('verify_amazon_login', ('p50_ms',), False),
+    ('verify_amazon_login', ('p99_ms',), False),
+    ('verify_amazon_login', ('parse', 'p50_ms'), False),
+    ('verify_amazon_login', ('peak_rss_kb',), False),
+]
+
+def _lookup(report, name, path):
+    value = report['results'].get(name)
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def compare(baseline, report):
+    print(f"\nchange vs {baseline.get('commit') or 'baseline'} (positive = better)")
+    if baseline.get('params') != report.get('params'):
+        print("  note: the two runs used different parameters")
+    for name, path, higher_is_better in COMPARED_METRICS:
+        old, new = _lookup(baseline, name, path), _lookup(report, name, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        if not higher_is_better:
+            change = -change
+        print(f"  {name}.{'.'.join(path):<24} {old:12.2f} -> {new:12.2f}  {change:+6.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the order crawl against a local fake Amazon server")
+    parser.add_argument("--orders", type=int, default=200, help="orders in the fake account")
+    parser.add_argument("--page-size", type=int, default=10, help="orders per order-history page")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the server waits before each response")
+    parser.add_argument("--filler-kb", type=int, default=64, help="kilobytes of inline script per order-history page")
+    parser.add_argument("--summary", choices=("pdf", "html"), default="pdf", help="what the printable summary link returns")
+    parser.add_argument("--pdf-kb", type=int, default=64, help="size of each printable summary")
+    parser.add_argument("--since", help="crawl only orders placed on or after this date (YYYY-MM-DD); the fake history ends in 2024")
+    parser.add_argument("--until", help="crawl only orders placed on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-per-host", type=int, default=4)
+    parser.add_argument("--http-cache", action="store_true", help="crawl with the on-disk HTTP cache (warm after the first run)")
+    parser.add_argument("--repeat", type=int, default=3, help="crawls per benchmark; the median is reported")
+    parser.add_argument("--verify-repeat", type=int, default=50, help="verify_amazon_login calls")
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append", help="run just this benchmark (repeatable)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results from an earlier run to compare against")
+    args = parser.parse_args()
+    
+    params = {
+        'orders': args.orders,
+        'page_size': args.page_size,
+        'latency': args.latency,
+        'filler_kb': args.filler_kb,
+        'summary': args.summary,
+        'pdf_kb': args.pdf_kb,
+        'since': args.since,
+        'until': args.until,
+        'workers': args.workers,
+        'max_per_host': args.max_per_host,
+        'http_cache': args.http_cache,
+        'repeat': max(1, args.repeat),
+        'verify_repeat': max(1, args.verify_repeat),
+    }
+    
+    report = run_all(params, args.only or list(BENCHMARKS))
+    print_report(report)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amazon_invoices.parsing import parse_html, find_order_cards, extract_order_id, classify_links, find_printable_link
+from synthetic import order_history_page, invoice_page
+
+BASE_URL = "https://www.amazon.com/gp/your-account/order-history"
+
+# The extraction as it was done before amazon_invoices.parsing: BeautifulSoup's html.parser
+# and a separate lowercase-and-test loop over every anchor for each kind of link
+def legacy_extract(page):
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(page, 'html.parser')
+    containers = soup.select('.order') or soup.select('.js-order-card') or soup.select('.order-card')
+    found = []
+    for container in containers:
+        order_id_elem = container.select_one('.order-info .value, .order-id, .yo-orderid, [data-test-id="order-id-container"]')
+        invoice_links = []
+        for link in container.select('a'):
+            href = link.get('href', '')
+            text = link.text.lower()
+            if 'invoice' in text or 'invoice' in href.lower() or 'receipt' in text or 'receipt' in href.lower():
+                invoice_links.append(href)
+        if not invoice_links:
+            for link in container.select('a'):
+                href = link.get('href', '')
+                text = link.text.lower()
+                if 'order details' in text or 'details' in text or 'view order' in text or 'order-details' in href:
+                    break
+        found.append((order_id_elem.text.strip() if order_id_elem else None, invoice_links))
+    return found
+
+def legacy_printable(page):
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(page, 'html.parser')
+    for link in soup.select('.a-popover-content a, [data-action="a-popover"] a'):
+        text = link.text.lower()
+        if 'print' in text or 'summary' in text or 'invoice' in text:
+            return link.get('href')
+    return None
+
+def current_extract(page):
+    root = parse_html(page)
+    return [(extract_order_id(card), classify_links(card, BASE_URL)['invoice']) for card in find_order_cards(root)]
+
+def current_printable(page):
+    return find_printable_link(parse_html(page), BASE_URL)
+
+def timeit(func, arg, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare order-page parsing speed: BeautifulSoup html.parser vs lxml")
+    parser.add_argument("--orders", type=int, default=50, help="order cards per history page")
+    parser.add_argument("--filler-kb", type=int, default=256, help="kilobytes of inline script per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    history = order_history_page(0, args.orders, args.orders, filler_kb=args.filler_kb).encode('utf-8')
+    invoice = invoice_page(order_id="111-0000000-0000000", filler_kb=args.filler_kb).encode('utf-8')
+    
+    has_bs4 = importlib.util.find_spec('bs4') is not None
+    if not has_bs4:
+        print("beautifulsoup4 is not installed; only the current parser is timed")
+    
+    print(f"order history page: {len(history) / 1024:.0f} KiB, {args.orders} orders")
+    for name, current, legacy, page in [
+        ("order history", current_extract, legacy_extract, history),
+        ("invoice page", current_printable, legacy_printable, invoice),
+    ]:
+        new = timeit(current, page, args.repeat)
+        line = f"{name:>14}: lxml {new * 1000:8.2f} ms"
+        if has_bs4:
+            old = timeit(legacy, page, args.repeat)
+            line += f" | html.parser {old * 1000:8.2f} ms | speedup {old / new:5.1f}x"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amazon_invoices.dataset import InvoiceDataset, spend_by_month, spend_by_category, spend_by_tax_year
+
+WORDS = ["USB C charger", "paperback novel", "organic coffee", "cotton socks", "kitchen knife", "vitamin D",
+         "printer ink", "LEGO set", "HDMI cable", "bath towels", "widget", "notebook"]
+
+# Function to build a synthetic order record shaped like the ones fetch_amazon_orders stores
+def synthetic_record(index, rng, fetched_at):
+    items = [
+        {'title': f"{rng.choice(WORDS)} model {rng.randrange(2000)}", 'quantity': rng.randrange(1, 4),
+         'price': rng.choice([None, rng.randrange(200, 20000) / 100])}
+        for _ in range(rng.randrange(1, 5))
+    ]
+    subtotal = round(sum((item['price'] or 10.0) * item['quantity'] for item in items), 2)
+    tax = round(subtotal * 0.08, 2)
+    return {
+        'order_id': f"{111 + index % 3}-{index:07d}-{rng.randrange(10 ** 7):07d}",
+        'order_date': datetime.date(2015, 1, 1) + datetime.timedelta(days=rng.randrange(3650)),
+        'items': items,
+        'item_count': sum(item['quantity'] for item in items),
+        'subtotal': subtotal,
+        'shipping': 0.0,
+        'tax': tax,
+        'total': subtotal + tax,
+        'currency': 'USD',
+        'payment_method': 'Visa | Last digits: 1234',
+        'source': 'invoice',
+        'fetched_at': fetched_at,
+    }
+
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Time spend reports over a synthetic order dataset")
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=5, help="part files the orders are spread over, as after that many downloads")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    directory = tempfile.mkdtemp(prefix="bench_reports_")
+    try:
+        rng = random.Random(0)
+        dataset = InvoiceDataset(directory)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        per_run = max(1, args.orders // args.runs)
+        for index in range(args.orders):
+            dataset.add(synthetic_record(index, rng, now))
+            if (index + 1) % per_run == 0:
+                dataset.flush()
+        dataset.flush()
+        
+        load_time, table = best_of(dataset.load, args.repeat)
+        print(f"{table.num_rows} orders in {len(dataset._parts())} part files")
+        print(f"{'load':>10}: {load_time * 1000:8.2f} ms")
+        for name, report in [("month", spend_by_month), ("category", spend_by_category), ("tax year", spend_by_tax_year)]:
+            elapsed, result = best_of(lambda: report(table), args.repeat)
+            print(f"{name:>10}: {elapsed * 1000:8.2f} ms  ({result.num_rows} rows)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import re
+import sys
+import time
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from synthetic import order_history_page, order_details_page, invoice_page, order_id_for, order_indices_for_year
+
+ORDERS_PATH = "/gp/your-account/order-history"
+
+# Function to build a minimal, valid-looking PDF padded to roughly the given size
+def fake_pdf(order_id, kilobytes):
+    header = b"%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\n"
+    padding = b"% " + (order_id.encode("ascii") + b" ") * 8 + b"\n"
+    body = header + padding * max(1, kilobytes * 1024 // len(padding))
+    return body + b"trailer << /Root 1 0 R >>\n%%EOF\n"
+
+# Clients that close a streamed response early (as session_is_valid does) aren't errors here
+class QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+# Local stand-in for Amazon's order history, order-details, invoice and printable summary pages.
+# Every request sleeps for `latency` seconds first, to model network round trips, and is
+# counted per route so benchmarks can report how many requests a run really made.
+class FakeAmazonServer:
+    def __init__(self, orders=50, page_size=10, latency=0.0, filler_kb=64, summary="pdf", pdf_kb=64, seed=0):
+        self.orders = orders
+        self.page_size = page_size
+        self.latency = latency
+        self.filler_kb = filler_kb
+        self.summary = summary
+        self.pdf_kb = pdf_kb
+        self.seed = seed
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = QuietHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    @property
+    def orders_url(self):
+        return self.base_url + ORDERS_PATH
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+    
+    def _count(self, route):
+        with self._lock:
+            self.requests[route] += 1
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, *args):
+                pass
+            
+            def _send(self, body, content_type="text/html; charset=utf-8", status=200):
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                
+                parts = urlsplit(self.path)
+                match = re.match(r"^/(order-details|invoice|print-summary)/([\w-]+)$", parts.path)
+                
+                if parts.path == ORDERS_PATH:
+                    server._count("orders")
+                    query = parse_qs(parts.query)
+                    start = int(query.get("startIndex", ["0"])[0])
+                    
+                    # Year filters ("orderFilter=year-2023") list just that year's orders
+                    time_filter = (query.get("orderFilter") or query.get("timeFilter") or [""])[0]
+                    if time_filter.startswith("year-"):
+                        indices = order_indices_for_year(int(time_filter[5:]), server.orders)
+                        param = "orderFilter" if "orderFilter" in query else "timeFilter"
+                        self._send(order_history_page(start, server.page_size, len(indices), filler_kb=server.filler_kb,
+                                                      seed=server.seed, offset=indices.start,
+                                                      filter_query=f"{param}={time_filter}&"))
+                    else:
+                        self._send(order_history_page(start, server.page_size, server.orders,
+                                                      filler_kb=server.filler_kb, seed=server.seed))
+                elif match and match.group(1) == "order-details":
+                    server._count("order-details")
+                    self._send(order_details_page(match.group(2), filler_kb=server.filler_kb // 2, seed=server.seed))
+                elif match and match.group(1) == "invoice":
+                    server._count("invoice")
+                    self._send(invoice_page(match.group(2), filler_kb=server.filler_kb // 2, seed=server.seed))
+                elif match:
+                    server._count("print-summary")
+                    if server.summary == "pdf":
+                        self._send(fake_pdf(match.group(2), server.pdf_kb), content_type="application/pdf")
+                    else:
+                        self._send(invoice_page(match.group(2), filler_kb=server.pdf_kb, seed=server.seed))
+                else:
+                    server._count("other")
+                    self._send("<html><body>Not found</body></html>", status=404)
+        
+        return Handler
+
+if __name__ == "__main__":
+    with FakeAmazonServer(orders=25) as fake:
+        print(f"Serving a fake order history at {fake.orders_url}  (Ctrl+C to stop)")
+        print(f"First order: {order_id_for(0)}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
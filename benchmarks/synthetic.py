@@ -0,0 +1,154 @@
+import zlib
+import random
+
+# Synthetic stand-ins for Amazon's order pages, shaped like the markup the parser expects.
+# Pages are deterministic for a given seed so benchmark runs are comparable.
+
+NAV_BAR = """
+<header id="navbar">
+  <div id="nav-tools">
+    <a id="nav-link-accountList" href="/gp/css/homepage.html">
+      <span id="nav-link-accountList-nav-line-1">Hello, Bench</span>
+      <span class="nav-line-2">Account &amp; Lists</span>
+    </a>
+    <a href="/gp/css/order-history">Returns &amp; Orders</a>
+    <a href="/gp/cart/view.html">Cart</a>
+  </div>
+</header>
+"""
+
+STYLES = ".a-box-group .a-box { color: #111; margin: 0 0 14px; }\n" * 50
+
+# Inline scripts and styles make up most of a real order page's weight
+def _filler(kilobytes, rng):
+    chunk = "var a%d = {k: '%s', v: [1, 2, 3, 4, 5, 6, 7, 8]};\n"
+    lines = []
+    size = 0
+    while size < kilobytes * 1024:
+        line = chunk % (rng.randrange(10 ** 6), "x" * rng.randrange(20, 80))
+        lines.append(line)
+        size += len(line)
+    return "<script>\n" + "".join(lines) + "</script>\n"
+
+def order_id_for(index):
+    return f"{111 + index % 800:03d}-{(index * 7919) % 10 ** 7:07d}-{(index * 104729) % 10 ** 7:07d}"
+
+# Newest first: one order every three days going back from the end of 2024
+def order_year_for(index):
+    return 2024 - (index * 3) // 365
+
+# Function to find the indices of the orders placed in a year, as a range
+def order_indices_for_year(year, total):
+    indices = [i for i in range(total) if order_year_for(i) == year]
+    return range(indices[0], indices[-1] + 1) if indices else range(0)
+
+def order_date_for(index):
+    day_of_year = 365 - (index * 3) % 365
+    year = order_year_for(index)
+    month = min(12, 1 + (day_of_year - 1) // 31)
+    day = min(28, 1 + (day_of_year - 1) % 31)
+    months = ["January", "February", "March", "April", "May", "June", "July",
+              "August", "September", "October", "November", "December"]
+    return f"{months[month - 1]} {day}, {year}"
+
+def _order_card(index, base, with_invoice_link, rng):
+    order_id = order_id_for(index)
+    items = "".join(
+        f'<div class="a-fixed-left-grid item-box"><a class="a-link-normal" href="/dp/B0{rng.randrange(10 ** 8):08d}">'
+        f'<img src="https://images.example/{rng.randrange(10 ** 6)}.jpg" alt="item"/>Synthetic product {i}</a>'
+        f'<a class="a-button-text" href="/gp/buyagain?ats={rng.randrange(10 ** 6)}">Buy it again</a></div>'
+        for i in range(rng.randrange(1, 4))
+    )
+    invoice = (f'<a class="a-link-normal" href="{base}/invoice/{order_id}">Invoice</a>'
+               if with_invoice_link else "")
+    return f"""
+<div class="a-box-group a-spacing-base order js-order-card">
+  <div class="a-box a-color-offset-background order-header">
+    <div class="a-column"><span class="a-color-secondary label">Order placed</span>
+      <span class="a-color-secondary value">{order_date_for(index)}</span></div>
+    <div class="a-column"><span class="a-color-secondary label">Total</span>
+      <span class="a-color-secondary value">${rng.randrange(500, 50000) / 100:.2f}</span></div>
+    <div class="a-fixed-right-grid-col actions order-info">
+      <span class="a-color-secondary label">Order #</span>
+      <bdi class="a-color-secondary value yo-orderid" dir="ltr">{order_id}</bdi>
+      <a class="a-link-normal" href="{base}/order-details/{order_id}">View order details</a>
+      {invoice}
+    </div>
+  </div>
+  <div class="a-box shipment">{items}</div>
+</div>
+"""
+
+# Function to render one page of the order history
+# With a time filter, start and total count within the filtered orders, which begin at
+# offset, and filter_query (e.g. "orderFilter=year-2023&") is kept in the pagination links
+def order_history_page(start, count, total, base="", filler_kb=64, invoice_links=True, seed=0, offset=0, filter_query=""):
+    rng = random.Random(seed * 100003 + offset + start)
+    end = min(start + count, total)
+    cards = "".join(_order_card(i, base, invoice_links and i % 2 == 0, rng) for i in range(offset + start, offset + end))
+    
+    if end < total:
+        last = f'<li class="a-last"><a href="?{filter_query}startIndex={end}">Next<span class="a-letter-space"></span>→</a></li>'
+    else:
+        last = '<li class="a-disabled a-last">Next</li>'
+    
+    return f"""<!doctype html>
+<html lang="en-us"><head><meta charset="utf-8"><title>Your Orders</title>
+<style>{STYLES}</style>
+{_filler(filler_kb // 2, rng)}
+</head><body>
+{NAV_BAR}
+<div id="ordersContainer">
+{cards}
+</div>
+<div class="a-row"><ul class="a-pagination">
+  <li class="a-normal"><a href="?{filter_query}startIndex=0">1</a></li>
+  {last}
+</ul></div>
+{_filler(filler_kb // 2, rng)}
+</body></html>
+"""
+
+# Function to render an order-details page that links to the invoice
+def order_details_page(order_id, base="", filler_kb=32, seed=0):
+    rng = random.Random(zlib.crc32(f"{seed}:{order_id}".encode()))
+    return f"""<!doctype html>
+<html><head><meta charset="utf-8"><title>Order Details</title>{_filler(filler_kb, rng)}</head><body>
+{NAV_BAR}
+<div class="a-box">
+  <h1>Order Details</h1>
+  <a class="a-link-normal" href="{base}/invoice/{order_id}">Invoice</a>
+  <a class="a-link-normal" href="/gp/help">Problem with order</a>
+</div>
+</body></html>
+"""
+
+# Function to render an invoice page with the printable-summary link in a popover
+def invoice_page(order_id, base="", filler_kb=32, seed=0):
+    rng = random.Random(zlib.crc32(f"{seed}:{order_id}:invoice".encode()))
+    prices = [rng.randrange(200, 20000) / 100 for _ in range(rng.randrange(1, 4))]
+    quantities = [rng.randrange(1, 3) for _ in prices]
+    subtotal = round(sum(price * quantity for price, quantity in zip(prices, quantities)), 2)
+    tax = round(subtotal * 0.0825, 2)
+    shipping = 0.0 if subtotal > 35 else 5.99
+    items = "".join(
+        f'<tr><td>{quantity} of: <i>Synthetic product {i}</i><br/>Sold by: Example Seller<br/>Condition: New</td>'
+        f'<td>${price:.2f}</td></tr>'
+        for i, (price, quantity) in enumerate(zip(prices, quantities))
+    )
+    return f"""<!doctype html>
+<html><head><meta charset="utf-8"><title>Invoice</title>{_filler(filler_kb, rng)}</head><body>
+{NAV_BAR}
+<div class="a-popover-preload"><div class="a-popover-content">
+  <a class="a-link-normal" href="{base}/print-summary/{order_id}">Printable Order Summary</a>
+</div></div>
+<table class="invoice-items"><tr><th>Items Ordered</th><th>Price</th></tr>{items}</table>
+<div class="payment">Payment Method:<br/>Visa | Last digits: {rng.randrange(10000):04d}</div>
+<table class="invoice-totals">
+  <tr><td>Item(s) Subtotal:</td><td>${subtotal:.2f}</td></tr>
+  <tr><td>Shipping &amp; Handling:</td><td>${shipping:.2f}</td></tr>
+  <tr><td>Estimated tax to be collected:</td><td>${tax:.2f}</td></tr>
+  <tr><td>Grand Total:</td><td>${subtotal + tax + shipping:.2f}</td></tr>
+</table>
+</body></html>
+"""
@@ -0,0 +1,44 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from amazon_invoices.dataset import spend_by_category
+
+RULES = [('Electronics', r'cable'), ('Books', r'book')]
+
+def _orders(*orders):
+    return pa.table({
+        'items': [items for items, _ in orders],
+        'subtotal': [subtotal for _, subtotal in orders],
+        'total': [subtotal for _, subtotal in orders],
+    })
+
+def _spend(table):
+    result = spend_by_category(table, RULES).to_pydict()
+    return dict(zip(result['category'], result['spend']))
+
+# Priced items count at their price; unpriced ones share the rest of the subtotal
+def test_mixed_order_counts_priced_items_once():
+    table = _orders(([
+        {'title': 'USB cable', 'quantity': 2, 'price': 5.0},
+        {'title': 'Paperback book', 'quantity': 1, 'price': None},
+        {'title': 'Mug', 'quantity': 3, 'price': None},
+    ], 50.0))
+    
+    assert _spend(table) == {'Electronics': 10.0, 'Books': 10.0, 'Other': 30.0}
+
+def test_unpriced_order_splits_subtotal_by_quantity():
+    table = _orders(([
+        {'title': 'USB cable', 'quantity': 1, 'price': None},
+        {'title': 'Paperback book', 'quantity': 3, 'price': None},
+    ], 20.0))
+    
+    assert _spend(table) == {'Books': 15.0, 'Electronics': 5.0}
+
+def test_priced_items_over_subtotal_leave_nothing_to_share():
+    table = _orders(([
+        {'title': 'USB cable', 'quantity': 1, 'price': 25.0},
+        {'title': 'Paperback book', 'quantity': 1, 'price': None},
+    ], 20.0))
+    
+    assert _spend(table) == {'Electronics': 25.0, 'Books': 0.0}
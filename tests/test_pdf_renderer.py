@@ -0,0 +1,86 @@
+import time
+import base64
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+pytest.importorskip("selenium")
+
+from amazon_invoices import pdf_renderer
+from amazon_invoices.pdf_renderer import render_pdf
+
+STYLESHEET_DELAY = 0.5
+
+SUMMARY = """<html><head><link rel="stylesheet" href="style.css"></head>
+<body><h1>Order Summary</h1><p>Order #111-0000000-0000000</p></body></html>"""
+
+# Records the CDP commands it is sent; the document reports itself loaded after a few polls
+class FakeDriver:
+    def __init__(self, polls_until_loaded=3):
+        self.polls_until_loaded = polls_until_loaded
+        self.calls = []
+    
+    def execute_cdp_cmd(self, command, params):
+        self.calls.append(command)
+        if command == 'Page.getFrameTree':
+            return {'frameTree': {'frame': {'id': 'main'}}}
+        if command == 'Page.printToPDF':
+            return {'data': base64.b64encode(b'%PDF-1.4').decode('ascii')}
+        return {}
+    
+    def execute_script(self, script):
+        self.calls.append('readyState')
+        self.polls_until_loaded -= 1
+        return 'complete' if self.polls_until_loaded <= 0 else 'interactive'
+
+def test_prints_only_once_the_document_has_loaded(monkeypatch):
+    monkeypatch.setattr(pdf_renderer, 'LOAD_POLL_INTERVAL', 0)
+    driver = FakeDriver(polls_until_loaded=3)
+    
+    assert render_pdf(driver, SUMMARY, "https://www.amazon.com/") == b'%PDF-1.4'
+    assert driver.calls == ['Page.getFrameTree', 'Page.setDocumentContent',
+                            'readyState', 'readyState', 'readyState', 'Page.printToPDF']
+
+def test_prints_anyway_when_loading_times_out():
+    driver = FakeDriver(polls_until_loaded=10 ** 6)
+    
+    assert render_pdf(driver, SUMMARY, load_timeout=0.1) == b'%PDF-1.4'
+    assert driver.calls[-1] == 'Page.printToPDF'
+
+# Serves the summary's stylesheet slowly, so a render that doesn't wait for it would miss it
+class StylesheetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(STYLESHEET_DELAY)
+        body = b"body { background-color: rgb(1, 2, 3); }"
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/css')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stylesheet_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StylesheetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/summary/"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def driver():
+    from amazon_invoices.browser import start_browser
+    try:
+        driver = start_browser()
+    except Exception as e:
+        pytest.skip(f"headless Chrome isn't available: {e}")
+    yield driver
+    driver.quit()
+
+def test_summary_stylesheet_is_applied_before_printing(driver, stylesheet_server):
+    pdf = render_pdf(driver, SUMMARY, stylesheet_server)
+    
+    assert pdf.startswith(b'%PDF')
+    assert driver.execute_script("return getComputedStyle(document.body).backgroundColor") == 'rgb(1, 2, 3)'